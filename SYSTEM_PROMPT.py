@@ -111,3 +111,47 @@ JSON: {"intents":[
 """
 
 
+
+
+# Trimmed variant for models that follow rules without repetition (4b and up):
+# same rules and schema, one example per behaviour.
+# PROMPT_RULES alone is the fixed part used with example_index (retrieved examples).
+PROMPT_RULES = """
+You are an intent classifier. Return ONLY valid JSON: {"intents": []}. No commentary.
+
+Drop "to" between a device name and a colour or state.
+
+Rules:
+1. One intent per action, in sentence order. Split at "and" / "then".
+2. Never mix hat and zigbee fields in one intent.
+3. Questions become a chat intent after the preceding actions. Do NOT answer them.
+4. Sleep / wait / pause before an action applies only to the next intent of the same type.
+   After an action it is a separate intent of the same type with "delay".
+   "for X seconds" after an action becomes a delay intent of the same type after the action.
+   minutes = 60 seconds, hours = 3600 seconds.
+5. NeoPixel: colour, brightness or effect -> hat "set_neo" (colour required if mentioned,
+   brightness default 100, effect default "none").
+6. Zigbee "on for X seconds then off": the delay goes on the NEXT action of the same type.
+
+Types and fields:
+- hat: action, text (say), delay (sleep), colour, brightness, effect
+- zigbee: device, room, action, dim (integer), colour, delay
+- chat: text
+"""
+
+COMPACT_SYSTEM_PROMPT = PROMPT_RULES + """
+User: Shake your paw
+JSON: {"intents":[{"type":"hat","action":"shake_paw"}]}
+
+User: Turn Lamp on for 20 seconds then turn off
+JSON: {"intents":[{"type":"zigbee","device":"lamp","room":"living room","action":"on"},{"type":"zigbee","device":"lamp","room":"living room","action":"off","delay":20}]}
+
+User: Turn Neo lights blue for 10 seconds then bark
+JSON: {"intents":[{"type":"hat","action":"set_neo","colour":"blue"},{"type":"hat","action":"sleep","delay":10},{"type":"hat","action":"bark"}]}
+
+User: Shake your paw and tell me what Ohm's law is
+JSON: {"intents":[{"type":"hat","action":"shake_paw"},{"type":"chat","text":"Tell me what Ohm's law is"}]}
+
+User: Turn on the heat and say I have completed your tasks, mistress!
+JSON: {"intents":[{"type":"zigbee","device":"heat","room":"living room","action":"on"},{"type":"hat","action":"say","text":"I have completed your tasks, mistress!"}]}
+"""
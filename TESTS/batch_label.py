@@ -0,0 +1,90 @@
+"""
+Offline batch labelling with the router's LLMIntentProcessor.
+
+    python TESTS/batch_label.py transcripts.txt -o labels.jsonl --concurrency 16
+    python TESTS/batch_label.py --host http://localhost:11500   # bench corpus, e.g. against the mock server
+
+Reads one utterance per line (default: the bench_hot_paths corpus), runs
+them through LLMIntentProcessor.iter_batch with the router's prompt, client,
+fast path, cache and validator, and writes one JSON line per utterance:
+{"index", "text", "intents"} or {"index", "text", "error"}.
+Useful for re-labelling recorded transcripts, checking a prompt change
+across the corpus or warming the persistent template cache.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_hot_paths import CORPUS
+
+
+def load_processor(host):
+    if host:
+        # Another server's answers (e.g. the mock) must not go into the router's persistent cache
+        os.environ["INTENT_CACHE_DB"] = ""
+    with contextlib.redirect_stdout(io.StringIO()):
+        import async_intent_router as router
+    if host:
+        router.llm_processor.llm = router.LLMClient(
+            router.SYSTEM_PROMPT, model=router.LLM_MODEL, host=host,
+            reuse_prefix=router.REUSE_PROMPT_PREFIX, metrics=router.metrics, examples=router.example_index,
+            schema=router.output_schema,
+        )
+    return router.llm_processor
+
+
+async def run(args):
+    if args.input:
+        with open(args.input) as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = CORPUS
+    processor = load_processor(args.host)
+    out = open(args.output, "w") if args.output else sys.stdout
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    errors = 0
+    started = perf_counter()
+    try:
+        with quiet:
+            async for result in processor.iter_batch(texts, concurrency=args.concurrency, ordered=args.ordered):
+                record = {"index": result.index, "text": result.text}
+                if result.ok:
+                    record["intents"] = (result.intents or {}).get("intents", [])
+                else:
+                    errors += 1
+                    record["error"] = f"{type(result.error).__name__}: {result.error}"
+                print(json.dumps(record), file=out, flush=True)
+    finally:
+        await processor.llm.aclose()
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = perf_counter() - started
+    print(f"{len(texts)} utterances in {elapsed:.1f}s ({len(texts) / elapsed:.1f}/s), {errors} errors",
+          file=sys.stderr)
+    print(f"Metrics: {processor.metrics.snapshot()['counters']}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", help="file with one utterance per line")
+    parser.add_argument("-o", "--output", help="JSONL output file (default stdout)")
+    parser.add_argument("--host", help="LLM server, overriding the router's LLM_SERVER")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM calls in flight")
+    parser.add_argument("--unordered", dest="ordered", action="store_false", help="write results as they complete")
+    parser.add_argument("--verbose", action="store_true", help="keep the processor's per-call output")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Offline micro-benchmarks for the pure-Python routing hot paths.
+
+    python TESTS/bench_hot_paths.py                  # run, compare with baseline if present
+    python TESTS/bench_hot_paths.py --save-baseline  # record this machine's baseline
+    python TESTS/bench_hot_paths.py --tolerance 0.1  # fail on >10% regressions
+
+Each benchmark runs over the whole utterance corpus. Reports ops/sec (best of
+--repeat runs) and peak traced memory for one pass over the corpus. Exits
+with status 1 if any benchmark is slower or allocates more than the stored
+baseline allows. Baselines are machine specific - record one on the target
+(e.g. the Pi) before relying on the comparison.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cache_llm
+from cache_llm import (normalise, extract_numbers_and_replace, parse_actions, fill_template,
+                       route_command, extract_slots)
+from text_preprocessor import preprocess_text_for_model
+from normalisation_rules import normalise_object
+from fast_path import RuleBasedClassifier
+from json_repair import repair_json
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# cache_llm.__main__, TESTS/intent_example.py and messtest.sh
+CORPUS = [
+    "Please say ''Welcome mistress''",
+    "sit for 10 seconds say Hello PiDog!",
+    "sit for 20 seconds and say I obey",
+    "sit for 10 seconds and say I obey. Finally bark",
+    "sit for 5 seconds and wag your tail 2 times",
+    "sit for 10 seconds and wag your tail 3 times",
+    "say I am your robot friend",
+    "lie down and howl",
+    "scratch 2 times and scratch your head",
+    "walk 10 seconds and turn around",
+    "sit for 4 seconds say tasks completed mistress!",
+    "sit for 4 seconds and sit for 3 seconds",
+    "sit for 2 seconds sit for 13 seconds",
+    "Shake your paw",
+    "Turn lamp blue",
+    "Turn lamp to blue",
+    "Turn on the heat and say I have completed your tasks, mistress!",
+    "Shake your paw, howl and tell me what Ohm's law is",
+    "Turn on the living room light, sleep 2 minutes, dim it to 40%, bark, wait 10 seconds, say Hello, "
+    "then tell me what Ohm's law is, and finally stand up.",
+    "Turn Lamp on for 20 seconds then turn off. Finally tell me Ohm's law'",
+    "Sleep for 10 seconds. Turn NEO lights red. Shake your Paw and say doing as you wish, mistress! "
+    "Turn Lamp on for 20 seconds then turn off",
+    "sit, wag your tail, and bark. Turn lamp on and tell me when you are done. "
+    "Finally, tell me what Ohm's law is.",
+]
+
+DEVICES = ["lamp", "Light", "ceiling light", "neo", "NeoPixel", "heat", "fan"]
+
+# Typical LLM replies: clean, and the near-valid shapes gemma3:1b produces
+LLM_REPLIES = [
+    '{"intents":[{"type":"hat","action":"sit"},{"type":"hat","action":"sleep","delay":10},'
+    '{"type":"hat","action":"say","text":"Hello PiDog!"}]}',
+    '```json\n{"intents":[{"type":"zigbee","device":"lamp","room":"living room","action":"on"},]}\n```',
+    "{'intents':[{'type':'chat','text':'What is Ohm's law?'}]}",
+    '{"intents":[{"type":"hat","action":"sit"},{"type":"hat","action":"howl"},{"type":"hat","act',
+]
+
+
+def _prepared():
+    normalised = [normalise(text) for text in CORPUS]
+    templates = [extract_numbers_and_replace(text) for text in normalised]
+    parsed = [(parse_actions(template), numbers) for template, numbers in templates]
+    return normalised, templates, parsed
+
+
+def benchmarks():
+    normalised, templates, parsed = _prepared()
+    classifier = RuleBasedClassifier()
+    return {
+        "normalise": lambda: [normalise(t) for t in CORPUS],
+        "extract_numbers_and_replace": lambda: [extract_numbers_and_replace(t) for t in normalised],
+        "parse_actions": lambda: [parse_actions(t) for t, _ in templates],
+        "fill_template": lambda: [fill_template(a, n, text="hello") for a, n in parsed],
+        "route_command_warm": lambda: [route_command(t) for t in CORPUS],
+        "extract_slots": lambda: [extract_slots(t) for t in CORPUS],
+        "preprocess_text_for_model": lambda: [preprocess_text_for_model(t, "gemma3:1b") for t in CORPUS],
+        "normalise_object": lambda: [normalise_object(d) for d in DEVICES],
+        "fast_path_classify": lambda: [classifier.match(t) for t in CORPUS],
+        "repair_json_valid": lambda: [repair_json(r) for r in LLM_REPLIES[:1]],
+        "repair_json_broken": lambda: [repair_json(r) for r in LLM_REPLIES[1:]],
+    }
+
+
+def corpus_size(name):
+    if name == "normalise_object":
+        return len(DEVICES)
+    if name.startswith("repair_json"):
+        return 1 if name == "repair_json_valid" else len(LLM_REPLIES) - 1
+    return len(CORPUS)
+
+
+def measure(name, fn, repeat=5):
+    timer = timeit.Timer(fn)
+    # autorange picks a loop count taking >= 0.2s
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"ops_per_sec": round(corpus_size(name) / best, 1), "peak_bytes": peak - base}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['ops_per_sec']} ops/s vs baseline {base['ops_per_sec']}")
+        if result["peak_bytes"] > base["peak_bytes"] * (1 + tolerance) + 1024:
+            regressions.append(f"{name}: {result['peak_bytes']} B peak vs baseline {base['peak_bytes']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="only run benchmarks containing this text")
+    args = parser.parse_args()
+
+    # route_command prints on template misses; warm the cache quietly first
+    with contextlib.redirect_stdout(io.StringIO()):
+        for text in CORPUS:
+            route_command(text)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print(f"{'benchmark':32} {'ops/sec':>12} {'peak KiB':>10} {'vs baseline':>12}")
+    for name, fn in benchmarks().items():
+        if args.filter not in name:
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = measure(name, fn, repeat=args.repeat)
+        results[name] = result
+        base = baseline.get(name)
+        change = f"{result['ops_per_sec'] / base['ops_per_sec'] - 1:+.1%}" if base else "-"
+        print(f"{name:32} {result['ops_per_sec']:>12,.0f} {result['peak_bytes'] / 1024:>10.1f} {change:>12}")
+
+    print("Template cache:", cache_llm.TEMPLATE_CACHE.stats())
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+End-to-end load generator for async_intent_router.
+
+Starts the local mock Ollama server (TESTS/mock_ollama_server.py), points the
+router's LLM client at it and feeds utterances straight into the router's
+worker pool at a target rate, alternating between the stt/text and keybd/text
+topics. Intents go through the router's IntentPublisher to an in-process
+broker stand-in.
+
+    python TESTS/load_test.py --rate 20 --duration 30 --latency lognormal:0.4:0.5 --malformed 0.05
+
+Reports throughput, p50/p95/p99 end-to-end latency (submit -> last intent
+published), queue growth and dropped messages (shed by the pool, failed,
+suppressed as duplicates or not published within --drain seconds after the
+run). Only published messages count towards throughput and latency.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_ollama_server import MockOllamaServer
+from bench_hot_paths import CORPUS
+from intent_worker_pool import EMITTED
+
+SOURCES = ["stt/text", "keybd/text"]
+
+
+class StandInMQTTClient:
+    """In-process broker stand-in: publish() takes `latency` seconds, like a QoS 1 round trip."""
+    def __init__(self, latency=0.002):
+        self.latency = latency
+        self.messages = {}      # topic -> count
+
+    async def publish(self, topic, payload, qos=0):
+        await asyncio.sleep(self.latency)
+        self.messages[topic] = self.messages.get(topic, 0) + 1
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def load_router(mock_url: str, use_cache: bool, use_fast_path: bool, use_single_flight: bool):
+    # Memory-only template cache: mock answers must never reach the router's SQLite file
+    os.environ["INTENT_CACHE_DB"] = ""
+    with contextlib.redirect_stdout(io.StringIO()):
+        import async_intent_router as router
+
+    # Same client class and options as the router, aimed at the mock server
+    router.llm_processor.llm = router.LLMClient(
+        router.SYSTEM_PROMPT, model=router.LLM_MODEL, host=mock_url,
+        reuse_prefix=router.REUSE_PROMPT_PREFIX, metrics=router.metrics, examples=router.example_index,
+        schema=router.output_schema,
+    )
+    if not use_cache:
+        router.llm_processor.cache = None
+    if not use_fast_path:
+        router.llm_processor.fast_path = None
+    if not use_single_flight:
+        # The corpus is small, so most utterances would be suppressed as duplicates
+        router.llm_processor.coalesce = None
+    return router
+
+
+async def run(args):
+    mock = MockOllamaServer(args.latency, args.malformed, args.slots, seed=args.seed)
+    await mock.start(port=args.port)
+    router = load_router(f"http://127.0.0.1:{args.port}", args.cache, args.fast_path, args.single_flight)
+    pool = router.worker_pool
+    broker = StandInMQTTClient(args.broker_latency)
+    router.publisher.client = broker
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    rng = random.Random(args.seed)
+    latencies = []
+    outcomes = {}
+    pending = []
+    queue_depths = []
+    total = int(args.rate * args.duration)
+
+    async def track(done, submitted):
+        outcome = await done
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if outcome == EMITTED:
+            latencies.append(perf_counter() - submitted)
+
+    async def sample_queue():
+        while True:
+            queue_depths.append(pool.stats()["queue_depth"])
+            await asyncio.sleep(0.1)
+
+    with quiet:
+        pool.start()
+        sampler = asyncio.create_task(sample_queue())
+        started = perf_counter()
+        for i in range(total):
+            # Open loop: keep the schedule even if the router falls behind
+            delay = started + i / args.rate - perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            submitted = perf_counter()
+            done = await pool.submit(SOURCES[i % len(SOURCES)], rng.choice(CORPUS))
+            pending.append(asyncio.create_task(track(done, submitted)))
+        offered_for = perf_counter() - started
+
+        _, not_done = await asyncio.wait(pending, timeout=args.drain) if pending else (set(), set())
+        elapsed = perf_counter() - started
+        sampler.cancel()
+        for task in not_done:
+            task.cancel()
+        await router.publisher.flush()
+        await pool.stop()
+        await router.llm_processor.llm.aclose()
+    await mock.stop()
+
+    stats = pool.stats()
+    completed = len(latencies)
+    dropped = {outcome: count for outcome, count in outcomes.items() if outcome != EMITTED}
+    print(f"Offered      {total} messages at {args.rate}/s over {offered_for:.1f}s")
+    print(f"Published    {completed} in {elapsed:.1f}s -> {completed / elapsed:.1f} msg/s")
+    print(f"Latency      p50 {percentile(latencies, 50) * 1000:.0f} ms, p95 {percentile(latencies, 95) * 1000:.0f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.0f} ms, max {max(latencies, default=0) * 1000:.0f} ms")
+    print(f"Queue depth  max {max(queue_depths, default=0)}, final {stats['queue_depth']}")
+    print(f"Dropped      {sum(dropped.values()) + len(not_done)}: {len(not_done)} unfinished after "
+          f"{args.drain}s drain, {dropped}")
+    print(f"Mock server  {mock.requests} requests, {mock.malformed_sent} malformed replies")
+    print(f"Publisher    {router.publisher.stats()} {broker.messages}")
+    print(f"Router       {router.metrics.snapshot()['counters']}")
+    if router.fast_path:
+        print(f"Fast path    {router.fast_path.stats()}")
+    print(f"Duplicates   {router.single_flight.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=5, help="utterances per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of offered load")
+    parser.add_argument("--latency", default="lognormal:0.3:0.5", help="mock LLM latency spec")
+    parser.add_argument("--malformed", type=float, default=0.0, help="fraction of malformed JSON replies")
+    parser.add_argument("--slots", type=int, default=2, help="mock server parallel inference slots")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--broker-latency", type=float, default=0.002, help="seconds per publish")
+    parser.add_argument("--drain", type=float, default=30, help="seconds to wait for stragglers")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="bypass the template cache")
+    parser.add_argument("--no-fast-path", dest="fast_path", action="store_false", help="bypass the rule fast path")
+    parser.add_argument("--single-flight", action="store_true",
+                        help="keep the router's duplicate suppression (off: repeated corpus lines are all processed)")
+    parser.add_argument("--verbose", action="store_true", help="keep the router's per-message output")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
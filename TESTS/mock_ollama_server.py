@@ -0,0 +1,209 @@
+"""
+Local stand-in for an Ollama / Hailo-ollama server.
+
+Serves POST /api/generate (OllamaClient) and POST /api/chat (OllamaClient with
+reuse_prefix, HailoClient), incl. stream=true and prefix priming, with a
+configurable latency distribution and canned outputs, a fraction of them
+deliberately malformed JSON. /api/chat remembers the last system message
+like Ollama's KV cache, so a repeated one is not counted in prompt_eval_count.
+
+    python TESTS/mock_ollama_server.py --port 11434 --latency lognormal:0.4:0.5 --malformed 0.05
+
+Latency specs: fixed:S, uniform:A:B, lognormal:MEDIAN:SIGMA (seconds).
+--slots limits concurrent "inference", like OLLAMA_NUM_PARALLEL.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fast_path import RuleBasedClassifier
+
+
+def parse_latency(spec: str, rng=random):
+    kind, *args = spec.split(":")
+    args = [float(a) for a in args]
+    if kind == "fixed":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(args[0], args[1])
+    if kind == "lognormal":
+        median, sigma = args
+        return lambda: rng.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"unknown latency spec {spec!r}")
+
+
+def user_text_from_prompt(prompt: str) -> str:
+    # Full prompt or user message, "...User text: X"
+    if "User text:" in prompt:
+        return prompt.rsplit("User text:", 1)[1].strip()
+    return prompt.strip()
+
+
+class MockOllamaServer:
+    """
+    canned outputs: simple HAT commands get the rule-based intents, anything
+    else becomes a single chat intent. `malformed` is the fraction of replies
+    cut off mid-JSON.
+    """
+    def __init__(self, latency="lognormal:0.3:0.5", malformed=0.0, slots=2, seed=None):
+        self.random = random.Random(seed)
+        self.latency = parse_latency(latency, self.random)
+        self.malformed = malformed
+        self.slots = asyncio.Semaphore(slots)
+        self.rules = RuleBasedClassifier()
+        self.requests = 0
+        self.malformed_sent = 0
+        self.cached_system = None
+        self.server = None
+
+    def answer(self, text: str) -> str:
+        intents, _ = self.rules.match(text)
+        body = json.dumps({"intents": intents or [{"type": "chat", "text": text}]})
+        if self.random.random() < self.malformed:
+            self.malformed_sent += 1
+            return body[:len(body) // 2]
+        return body
+
+    async def infer(self, text: str):
+        async with self.slots:
+            delay = self.latency()
+            await asyncio.sleep(delay)
+        return self.answer(text), delay
+
+    @staticmethod
+    def durations(delay: float, prompt_tokens: int) -> dict:
+        ns = int(delay * 1e9)
+        return {"total_duration": ns, "load_duration": 0, "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": ns // 3, "eval_count": 20, "eval_duration": ns - ns // 3}
+
+    async def generate(self, payload: dict, writer):
+        prompt = payload.get("prompt", "")
+        return await self.reply(payload, writer, user_text_from_prompt(prompt), len(prompt) // 4,
+                                lambda text: {"response": text})
+
+    async def chat(self, payload: dict, writer):
+        messages = payload.get("messages", [])
+        system = "".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        # Only the part after a cached system prefix is evaluated
+        if system == self.cached_system:
+            evaluated = [m for m in messages if m.get("role") != "system"]
+        else:
+            evaluated = messages
+        self.cached_system = system
+        prompt_tokens = sum(len(m.get("content", "")) for m in evaluated) // 4
+        user_text = user_text_from_prompt(messages[-1]["content"]) if messages else ""
+        return await self.reply(payload, writer, user_text, prompt_tokens,
+                                lambda text: {"message": {"role": "assistant", "content": text}})
+
+    async def reply(self, payload: dict, writer, user_text: str, prompt_tokens: int, body):
+        if payload.get("options", {}).get("num_predict") == 1:
+            # Prefix priming call: prompt tokens plus the one generated token
+            return {"model": payload.get("model"), **body(""), "done": True,
+                    **self.durations(0.0, prompt_tokens), "eval_count": 1}
+
+        text, delay = await self.infer(user_text)
+        stats = self.durations(delay, prompt_tokens)
+        if not payload.get("stream"):
+            return {"model": payload.get("model"), **body(text), "done": True, **stats}
+
+        # NDJSON token stream, a few characters per chunk
+        start_response(writer, "200 OK", "application/x-ndjson", chunked=True)
+        for i in range(0, len(text), 8):
+            write_chunk(writer, json.dumps({**body(text[i:i + 8]), "done": False}) + "\n")
+            await writer.drain()
+        write_chunk(writer, json.dumps({**body(""), "done": True, **stats}) + "\n")
+        write_chunk(writer, "")
+        await writer.drain()
+        return None
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    return
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                parts = request.split()
+                path = parts[1].decode() if len(parts) > 1 else "/"
+                self.requests += 1
+
+                payload = json.loads(body or b"{}")
+                if path == "/api/generate":
+                    result = await self.generate(payload, writer)
+                elif path == "/api/chat":
+                    result = await self.chat(payload, writer)
+                else:
+                    send_json(writer, "404 Not Found", {"error": f"unknown path {path}"})
+                    await writer.drain()
+                    continue
+                if result is not None:
+                    send_json(writer, "200 OK", result)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=11434):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+def start_response(writer, status, content_type, length=None, chunked=False):
+    head = f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+    head += "Transfer-Encoding: chunked\r\n" if chunked else f"Content-Length: {length}\r\n"
+    writer.write((head + "\r\n").encode())
+
+
+def write_chunk(writer, data: str):
+    raw = data.encode()
+    writer.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+
+
+def send_json(writer, status, obj):
+    body = json.dumps(obj).encode()
+    start_response(writer, status, "application/json", length=len(body))
+    writer.write(body)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", default="lognormal:0.3:0.5")
+    parser.add_argument("--malformed", type=float, default=0.0)
+    parser.add_argument("--slots", type=int, default=2)
+    args = parser.parse_args()
+
+    server = MockOllamaServer(args.latency, args.malformed, args.slots)
+    await server.start(args.host, args.port)
+    print(f"Mock Ollama on http://{args.host}:{args.port} (latency {args.latency}, malformed {args.malformed})")
+    started = perf_counter()
+    try:
+        while True:
+            await asyncio.sleep(10)
+            rate = server.requests / (perf_counter() - started)
+            print(f"requests {server.requests} ({rate:.1f}/s), malformed {server.malformed_sent}")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
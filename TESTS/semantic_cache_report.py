@@ -0,0 +1,175 @@
+"""
+Precision / recall of the semantic (signature) cache tier against a labelled corpus.
+
+    python TESTS/semantic_cache_report.py       # totals
+    python TESTS/semantic_cache_report.py -v    # list every decision
+
+The SEEDS are stored as if the LLM had answered them. Each QUERY is then
+looked up in the semantic tier only, refilled with its own slot values and
+compared with its labelled intents:
+
+    TP  hit, intents equal the label        FP  hit, intents differ
+    FN  miss, although a seed would refill   TN  miss, no seed fits
+        to the label
+
+Queries whose template key equals a seed key are exact-tier hits and are
+not counted. Precision must stay at 1.0 when ALIASES / STOPWORDS change.
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cache_llm import extract_slots, template_intents, fill_intents
+from semantic_cache import SemanticIntentCache
+
+
+def lamp(action, **fields):
+    return {"type": "zigbee", "device": "lamp", "room": "living room", "action": action, **fields}
+
+
+def device(name, action, room="living room", **fields):
+    return {"type": "zigbee", "device": name, "room": room, "action": action, **fields}
+
+
+def hat(action, **fields):
+    return {"type": "hat", "action": action, **fields}
+
+
+SEEDS = [
+    ("turn the lamp blue", [lamp("colour", colour="blue")]),
+    ("turn the lamp on", [lamp("on")]),
+    ("turn the lamp off", [lamp("off")]),
+    ("dim the lamp to 40%", [lamp("dim", dim=40)]),
+    ("turn neo lights red", [hat("set_neo", colour="red")]),
+    ("sit for 5 seconds then bark", [hat("sit"), hat("sleep", delay=5), hat("bark")]),
+    ("shake your paw and wag your tail", [hat("shake_paw"), hat("wag_tail")]),
+    ("lie down and howl", [hat("lie"), hat("howl")]),
+    ("sleep for 10 seconds and then bark", [hat("sleep", delay=10), hat("bark")]),
+    ("turn the lamp on for 20 seconds then turn off", [lamp("on"), lamp("off", delay=20)]),
+    ("bark and say hello", [hat("bark"), hat("say", text="hello")]),
+    ("spin around", [hat("spin")]),
+    ("turn the tv on", [device("tv", "on")]),
+]
+
+QUERIES = [
+    # Paraphrases - should hit
+    ("make the lamp red", [lamp("colour", colour="red")]),
+    ("set lamp to green", [lamp("colour", colour="green")]),
+    ("please turn the lamp purple", [lamp("colour", colour="purple")]),
+    ("switch on the lamp", [lamp("on")]),
+    ("could you turn the lamp on please", [lamp("on")]),
+    ("switch the lamp off", [lamp("off")]),
+    ("lamp off", [lamp("off")]),
+    ("dim lamp to 60", [lamp("dim", dim=60)]),
+    ("please dim the lamp to 25 percent", [lamp("dim", dim=25)]),
+    ("set the neo lights to green", [hat("set_neo", colour="green")]),
+    ("make neo lights blue", [hat("set_neo", colour="blue")]),
+    ("sit 10 seconds and then bark", [hat("sit"), hat("sleep", delay=10), hat("bark")]),
+    ("sit down for 3 seconds, then bark", [hat("sit"), hat("sleep", delay=3), hat("bark")]),
+    ("shake paw then wag tail", [hat("shake_paw"), hat("wag_tail")]),
+    ("please shake your paw and then wag your tail", [hat("shake_paw"), hat("wag_tail")]),
+    ("lie down then howl", [hat("lie"), hat("howl")]),
+    ("wait 5 seconds and bark", [hat("sleep", delay=5), hat("bark")]),
+    ("sleep 30 seconds then bark", [hat("sleep", delay=30), hat("bark")]),
+    ("switch the lamp on for 10 seconds and then turn it off", [lamp("on"), lamp("off", delay=10)]),
+    ("bark then say good morning", [hat("bark"), hat("say", text="good morning")]),
+    ("spin", [hat("spin")]),
+    ("switch the tv on", [device("tv", "on")]),
+    ("please switch on the tv", [device("tv", "on")]),
+    # Same words, different meaning - must miss
+    ("turn the heat on", [{"type": "zigbee", "device": "heat", "room": "living room", "action": "on"}]),
+    ("turn the bedroom lamp on", [{"type": "zigbee", "device": "lamp", "room": "bedroom", "action": "on"}]),
+    ("bark then sit for 5 seconds", [hat("bark"), hat("sit"), hat("sleep", delay=5)]),
+    ("wag your tail and shake your paw", [hat("wag_tail"), hat("shake_paw")]),
+    ("sleep for 2 minutes and then bark", [hat("sleep", delay=120), hat("bark")]),
+    ("turn the lamp on for 20 seconds", [lamp("on"), lamp("on", delay=20)]),
+    ("howl and lie down", [hat("howl"), hat("lie")]),
+    ("turn around", [hat("turn")]),
+    ("dim the neo lights to 40", [hat("set_neo", brightness=40)]),
+    ("say hello and bark", [hat("say", text="hello and bark")]),
+    ("don't turn the lamp on", []),
+    ("is the lamp on", [{"type": "chat", "text": "Is the lamp on?"}]),
+    ("is the lamp blue", [{"type": "chat", "text": "Is the lamp blue?"}]),
+    ("why is the lamp off", [{"type": "chat", "text": "Why is the lamp off?"}]),
+    ("the lamp is too blue", [{"type": "chat", "text": "The lamp is too blue"}]),
+    ("my lamp broke on friday", [{"type": "chat", "text": "My lamp broke on Friday"}]),
+    ("I hate it when you bark", [{"type": "chat", "text": "I hate it when you bark"}]),
+    ("bark bark", [hat("bark"), hat("bark")]),
+    # Unknown devices / rooms and extra clauses - must miss
+    ("turn the radio on", [device("radio", "on")]),
+    ("turn the kettle on", [device("kettle", "on")]),
+    ("turn on the garage lamp", [device("lamp", "on", room="garage")]),
+    ("turn on the lamp and the tv", [lamp("on"), device("tv", "on")]),
+    ("turn the tv on and bark", [device("tv", "on"), hat("bark")]),
+    ("make the garden lamp red", [device("lamp", "colour", room="garden", colour="red")]),
+    ("turn the tv volume on", [device("tv", "volume_on")]),
+]
+
+
+def seed_templates():
+    templates = []
+    for text, intents in SEEDS:
+        key, slots = extract_slots(text)
+        template = template_intents({"intents": intents}, slots)
+        if template is None:
+            print(f"WARNING: seed {text!r} cannot be templated, skipped")
+            continue
+        templates.append((key, template))
+    return templates
+
+
+def answerable(slots, expected, templates):
+    """True if some seed template, refilled with these slots, gives the label."""
+    for _, template in templates:
+        try:
+            if fill_intents(template, slots) == expected:
+                return True
+        except IndexError:
+            continue
+    return False
+
+
+def evaluate(templates, verbose=False):
+    cache = SemanticIntentCache()
+    for key, template in templates:
+        cache.store(key, template)
+    seed_keys = {key for key, _ in templates}
+
+    counts = {"TP": 0, "FP": 0, "FN": 0, "TN": 0}
+    for text, intents in QUERIES:
+        key, slots = extract_slots(text)
+        if key in seed_keys:
+            continue
+        expected = {"intents": intents}
+        template, learnt_from = cache.lookup(key)
+        if template is not None:
+            outcome = "TP" if fill_intents(template, slots) == expected else "FP"
+        else:
+            outcome = "FN" if answerable(slots, expected, templates) else "TN"
+        counts[outcome] += 1
+        if verbose:
+            print(f"  {outcome}  {text}" + (f"  <- {learnt_from}" if learnt_from else ""))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-v", "--verbose", action="store_true", help="list every query decision")
+    args = parser.parse_args()
+
+    templates = seed_templates()
+    print(f"{len(templates)} seeds, {len(QUERIES)} queries")
+    counts = evaluate(templates, args.verbose)
+    hits = counts["TP"] + counts["FP"]
+    positives = counts["TP"] + counts["FN"]
+    precision = counts["TP"] / hits if hits else 1.0
+    recall = counts["TP"] / positives if positives else 0.0
+    print(f"{'TP':>4} {'FP':>4} {'FN':>4} {'TN':>4} {'precision':>10} {'recall':>7}")
+    print(f"{counts['TP']:>4} {counts['FP']:>4} {counts['FN']:>4} {counts['TN']:>4} {precision:>10.3f} {recall:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
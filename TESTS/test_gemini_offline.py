@@ -0,0 +1,70 @@
+"""
+Offline checks for GeminiClient against mock_client.StandInGenaiClient:
+one genai client serves every request and the system prompt is sent once
+(system instruction / cached content), never inside `contents`.
+
+    python TESTS/test_gemini_offline.py      (or pytest TESTS/test_gemini_offline.py)
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# gemini_client needs google-genai for its config types, even with the stand-in client
+pytest.importorskip("google.genai")
+
+from gemini_client import GeminiClient, AsyncGeminiClient
+from mock_client import StandInGenaiClient
+
+PROMPT = "You are an intent parser. Reply with JSON only."
+UTTERANCES = ["shake your paw", "bark twice", "turn the lamp on"]
+
+
+def generate_calls(stand_in):
+    return [call for call in stand_in.calls if call[0] == "generate_content"]
+
+
+def test_reuses_one_client_and_sends_only_the_utterance():
+    stand_in = StandInGenaiClient()
+    client = GeminiClient(PROMPT, api_key="offline", genai_client=stand_in)
+    for text in UTTERANCES:
+        assert client.parse_intents(text) == {"intents": [{"type": "hat", "action": "shake_paw"}]}
+
+    assert client.genai_client is stand_in
+    calls = generate_calls(stand_in)
+    assert [contents for _, _, contents in calls] == UTTERANCES
+    assert all(PROMPT not in contents for _, _, contents in calls)
+    assert client.config.system_instruction == PROMPT
+
+
+def test_cached_prompt_is_uploaded_once():
+    stand_in = StandInGenaiClient()
+    client = GeminiClient(PROMPT, api_key="offline", cache_ttl=3600, genai_client=stand_in)
+    for text in UTTERANCES:
+        client.parse_intents(text)
+
+    assert [call[0] for call in stand_in.calls].count("caches.create") == 1
+    assert client.config.cached_content.startswith("cachedContents/")
+    assert client.config.system_instruction is None
+    assert all(PROMPT not in contents for _, _, contents in generate_calls(stand_in))
+
+
+def test_async_client_shares_the_same_client():
+    stand_in = StandInGenaiClient()
+    client = AsyncGeminiClient(PROMPT, api_key="offline", genai_client=stand_in)
+
+    async def run():
+        return await asyncio.gather(*(client.parse_intents(text) for text in UTTERANCES))
+
+    assert len(asyncio.run(run())) == len(UTTERANCES)
+    assert [contents for _, _, contents in generate_calls(stand_in)] == UTTERANCES
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,76 @@
+"""
+Pins json_repair.repair_json: each near-valid LLM reply in CASES parses to
+the expected data and reports the expected repairs; UNREPAIRABLE replies
+give {"error": "invalid_json"}.
+
+    python TESTS/test_json_repair.py      (or pytest TESTS/test_json_repair.py)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_repair import repair_json
+
+
+def hat(*actions):
+    return {"intents": [{"type": "hat", "action": action} for action in actions]}
+
+
+INVALID = {"error": "invalid_json"}
+
+# (reply, data, repairs)
+CASES = [
+    ('{"intents":[{"type":"hat","action":"bark"}]}', hat("bark"), []),
+    # Single quotes; an apostrophe inside a word is kept
+    ("{'intents':[{'type':'hat','action':'bark'}]}", hat("bark"), ["single_quotes"]),
+    ("{'intents':[{'type':'chat','text':'What is Ohm's law?'}]}",
+     {"intents": [{"type": "chat", "text": "What is Ohm's law?"}]}, ["single_quotes"]),
+    # Trailing commas
+    ('{"intents":[{"type":"hat","action":"bark"},]}', hat("bark"), ["trailing_comma"]),
+    ('{"intents":[{"type":"hat","action":"bark",},],}', hat("bark"), ["trailing_comma"]),
+    # Missing comma between objects
+    ('{"intents":[{"type":"hat","action":"sit"}{"type":"hat","action":"bark"}]}',
+     hat("sit", "bark"), ["missing_comma"]),
+    ('{"intents":[{"type":"hat","action":"sit"}\n  {"type":"hat","action":"bark"}]}',
+     hat("sit", "bark"), ["missing_comma"]),
+    # Truncated array: cut back to the last complete intent
+    ('{"intents":[{"type":"hat","action":"sit"},{"type":"hat","action":"bark"},{"type":"hat","act',
+     hat("sit", "bark"), ["truncated"]),
+    ('{"intents":[{"type":"hat","action":"sit"}', hat("sit"), ["truncated"]),
+    ('{"intents":[{"type":"hat","action":"sit"},', hat("sit"), ["truncated"]),
+    # Fenced code and surrounding text
+    ('```json\n{"intents":[{"type":"hat","action":"bark"}]}\n```', hat("bark"), ["code_fence"]),
+    ('```json\n{"intents":[{"type":"hat","action":"bark"},]}\n```', hat("bark"), ["code_fence", "trailing_comma"]),
+    ('```\n{"intents":[{"type":"hat","action":"bark"}]}\n```', hat("bark"), ["code_fence"]),
+    ('Here you go: {"intents":[{"type":"hat","action":"bark"}]} Anything else?', hat("bark"), ["surrounding_text"]),
+    # Python literals
+    ('{"intents":[{"type":"hat","action":"sit","loud":True}]}',
+     {"intents": [{"type": "hat", "action": "sit", "loud": True}]}, ["python_literal"]),
+]
+
+# (reply, repairs)
+UNREPAIRABLE = [
+    ("Sorry, I cannot help with that.", ["no_object"]),
+    ("", ["no_object"]),
+    ('{"intents":[{"type":"hat","act', ["truncated"]),
+    ('{"intents": [oops]}', ["unrepairable"]),
+    ('{"intents":[{"type":"hat" "action":"sit"}]}', ["unrepairable"]),
+]
+
+
+def test_repairs():
+    for reply, data, repairs in CASES:
+        assert repair_json(reply) == (data, repairs), reply
+
+
+def test_unrepairable():
+    for reply, repairs in UNREPAIRABLE:
+        assert repair_json(reply) == (INVALID, repairs), reply
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"ok  {name}")
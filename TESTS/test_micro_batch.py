@@ -0,0 +1,140 @@
+"""
+Pins micro_batch.MicroBatcher behaviour: a batch is sent when it reaches
+max_batch or when its window expires, and a failing utterance only fails
+its own caller.
+
+    python TESTS/test_micro_batch.py      (or pytest TESTS/test_micro_batch.py)
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from micro_batch import BATCH_INSTRUCTIONS, MicroBatcher
+
+
+class BatchingLLM:
+    """
+    Async client that answers numbered batch prompts with one result per
+    line. "fail" raises, and so does any batch containing it.
+    """
+    model = "stand-in"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    async def parse_intents(self, user_text: str) -> dict:
+        self.calls.append(user_text)
+        await asyncio.sleep(self.delay)
+        if not user_text.startswith(BATCH_INSTRUCTIONS):
+            return self.answer(user_text)
+        lines = user_text[len(BATCH_INSTRUCTIONS):].strip().splitlines()
+        texts = [line.split(". ", 1)[1] for line in lines]
+        return {"results": [{"id": i, **self.answer(text)} for i, text in enumerate(texts, 1)]}
+
+    @staticmethod
+    def answer(text):
+        if text == "fail":
+            raise RuntimeError("LLM error")
+        return {"intents": [{"type": "hat", "action": text}]}
+
+    def batch_calls(self):
+        return [call for call in self.calls if call.startswith(BATCH_INSTRUCTIONS)]
+
+
+def test_flushes_when_the_batch_is_full():
+    llm = BatchingLLM()
+    batcher = MicroBatcher(llm, max_batch=3, window=10)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.parse_intents(text) for text in ("sit", "bark", "howl"))), 1)
+
+    results = asyncio.run(run())
+    assert results == [{"intents": [{"type": "hat", "action": action}]} for action in ("sit", "bark", "howl")]
+    assert len(llm.calls) == 1 and len(llm.batch_calls()) == 1
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["batched_items"] == 3
+
+
+def test_overflow_goes_to_the_next_batch():
+    llm = BatchingLLM()
+    batcher = MicroBatcher(llm, max_batch=2, window=0.02)
+
+    async def run():
+        return await asyncio.gather(*(batcher.parse_intents(text) for text in ("sit", "bark", "howl")))
+
+    results = asyncio.run(run())
+    assert [r["intents"][0]["action"] for r in results] == ["sit", "bark", "howl"]
+    # One full batch, then the leftover alone after the window as a normal request
+    assert len(llm.batch_calls()) == 1 and llm.calls[-1] == "howl"
+
+
+def test_flushes_when_the_window_expires():
+    llm = BatchingLLM()
+    batcher = MicroBatcher(llm, max_batch=8, window=0.05)
+
+    async def run():
+        first = asyncio.ensure_future(batcher.parse_intents("sit"))
+        second = asyncio.ensure_future(batcher.parse_intents("bark"))
+        await asyncio.sleep(0.01)
+        waiting = not llm.calls
+        return waiting, await asyncio.gather(first, second)
+
+    waiting, results = asyncio.run(run())
+    assert waiting
+    assert [r["intents"][0]["action"] for r in results] == ["sit", "bark"]
+    assert len(llm.calls) == 1 and len(llm.batch_calls()) == 1
+
+
+def test_lone_utterance_is_a_normal_request():
+    llm = BatchingLLM()
+    batcher = MicroBatcher(llm, max_batch=4, window=0.01)
+
+    assert asyncio.run(batcher.parse_intents("sit")) == {"intents": [{"type": "hat", "action": "sit"}]}
+    assert llm.calls == ["sit"]
+    assert batcher.stats()["batches"] == 0
+
+
+def test_failure_is_isolated_to_its_caller():
+    llm = BatchingLLM()
+    batcher = MicroBatcher(llm, max_batch=3, window=10)
+
+    async def run():
+        return await asyncio.gather(*(batcher.parse_intents(text) for text in ("sit", "fail", "bark")),
+                                    return_exceptions=True)
+
+    sit, fail, bark = asyncio.run(run())
+    # The batch failed, so every utterance was retried on its own
+    assert batcher.stats()["fallbacks"] == 1
+    assert sit == {"intents": [{"type": "hat", "action": "sit"}]}
+    assert bark == {"intents": [{"type": "hat", "action": "bark"}]}
+    assert isinstance(fail, RuntimeError)
+
+
+def test_mismatched_batch_falls_back_to_single_calls():
+    class ShortLLM(BatchingLLM):
+        async def parse_intents(self, user_text):
+            result = await super().parse_intents(user_text)
+            if "results" in result:
+                result["results"].pop()
+            return result
+
+    llm = ShortLLM()
+    batcher = MicroBatcher(llm, max_batch=2, window=10)
+
+    async def run():
+        return await asyncio.gather(batcher.parse_intents("sit"), batcher.parse_intents("bark"))
+
+    results = asyncio.run(run())
+    assert [r["intents"][0]["action"] for r in results] == ["sit", "bark"]
+    assert sorted(llm.calls[1:]) == ["bark", "sit"]
+    assert batcher.stats()["fallbacks"] == 1
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,64 @@
+"""
+Pins cache_llm.parse_actions (single-pass ActionTokenizer) behaviour.
+
+Actions are whole words and the longest one wins. Compared with the old
+startswith-based splitter:
+  - "scratch_head" is scratch_head, not scratch
+  - a segment that only starts with an action ("barking", "sitting",
+    "walking", "sit_down") is no longer read as that action
+Everything else parses as before.
+
+    python TESTS/test_parse_actions.py      (or pytest TESTS/test_parse_actions.py)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_llm import parse_actions
+
+
+def action(name, **parameters):
+    return {"action": name, "parameters": parameters}
+
+
+UNCHANGED = [
+    ("sit and bark", [action("sit"), action("bark")]),
+    ("please sit", [action("sit")]),
+    ("bark bark", [action("bark"), action("bark")]),
+    ("sit for <VAR1> seconds", [action("sit", duration="<VAR1>")]),
+    ("scratch <VAR1>", [action("scratch", count1="<VAR1>")]),
+    ("spin <VAR1> <VAR2>", [action("spin", count1="<VAR1>", count2="<VAR2>")]),
+    ("led <VAR1> <VAR2>", [action("led", duration="<VAR1>", count1="<VAR2>")]),
+    ("lie down and howl <VAR1>", [action("lie"), action("howl", duration="<VAR1>")]),
+    ("walk <VAR1> and say hello", [action("walk", duration="<VAR1>"), action("say", text="<TEXT>")]),
+    ("shake_paw twice and wag_tail <VAR1>", [action("shake_paw"), action("wag_tail", count1="<VAR1>")]),
+]
+
+CHANGED = [
+    ("scratch_head <VAR1>", [action("scratch_head", count1="<VAR1>")]),
+    ("barking walk", [action("walk")]),
+    ("sitting <VAR1> then bark", [action("bark")]),
+    ("walking then spinning", []),
+    ("sit_down", []),
+]
+
+
+def check(cases):
+    for text, expected in cases:
+        assert parse_actions(text) == expected, (text, parse_actions(text))
+
+
+def test_unchanged_templates():
+    check(UNCHANGED)
+
+
+def test_actions_are_whole_words_longest_first():
+    check(CHANGED)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,140 @@
+"""
+Pins single_flight.SingleFlight behaviour: concurrent identical keys share
+one call, duplicates inside the window are suppressed, and a leader's
+error reaches every waiter.
+
+    python TESTS/test_single_flight.py      (or pytest TESTS/test_single_flight.py)
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from single_flight import SingleFlight
+
+
+def counting_call(result, delay=0.02, error=None):
+    """fn for SingleFlight.run() that counts how often it really runs."""
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return {"intents": [dict(intent) for intent in result["intents"]]}
+
+    return fn, calls
+
+
+def test_concurrent_identical_keys_share_one_call():
+    flight = SingleFlight(window=0)
+    fn, calls = counting_call({"intents": [{"type": "hat", "action": "bark"}]})
+
+    async def run():
+        return await asyncio.gather(*(flight.run(flight.key("bark"), fn) for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results == [{"intents": [{"type": "hat", "action": "bark"}]}] * 3
+    # Followers get their own copy, so one caller mutating it cannot affect another
+    results[1]["intents"].clear()
+    assert results[2]["intents"]
+    stats = flight.stats()
+    assert stats["leaders"] == 1 and stats["coalesced"] == 2 and stats["republished"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight(window=0)
+    fn, calls = counting_call({"intents": []})
+
+    async def run():
+        await asyncio.gather(flight.run("sit", fn), flight.run("bark", fn))
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_key_fn_normalises_requests():
+    flight = SingleFlight(window=0, key_fn=lambda text: text.strip("!?. ").lower())
+    fn, calls = counting_call({"intents": []})
+
+    async def run():
+        await asyncio.gather(flight.run(flight.key("Bark!"), fn), flight.run(flight.key("bark"), fn))
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+
+def test_duplicates_inside_the_window_are_suppressed():
+    flight = SingleFlight(window=0.05)
+    fn, calls = counting_call({"intents": []}, delay=0)
+
+    async def run():
+        first = await flight.run("bark", fn)
+        duplicate = await flight.run("bark", fn)
+        await asyncio.sleep(0.1)
+        # Window expired: a new leader runs
+        later = await flight.run("bark", fn)
+        return first, duplicate, later
+
+    first, duplicate, later = asyncio.run(run())
+    assert first == {"intents": []} and later == {"intents": []}
+    assert duplicate is None
+    assert len(calls) == 2
+    assert flight.stats()["suppressed"] == 1
+
+
+def test_in_flight_duplicates_after_the_window_share_the_result():
+    flight = SingleFlight(window=0.02)
+    fn, calls = counting_call({"intents": [{"type": "hat", "action": "sit"}]}, delay=0.1)
+
+    async def run():
+        leader = asyncio.ensure_future(flight.run("sit", fn))
+        await asyncio.sleep(0.05)
+        return await asyncio.gather(leader, flight.run("sit", fn))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results[0] == results[1] == {"intents": [{"type": "hat", "action": "sit"}]}
+
+
+def test_leader_error_reaches_waiters():
+    flight = SingleFlight(window=0)
+    fn, calls = counting_call({"intents": []}, error=RuntimeError("LLM down"))
+
+    async def run():
+        return await asyncio.gather(*(flight.run("bark", fn) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(e, RuntimeError) and str(e) == "LLM down" for e in results)
+    # Nothing is left in flight: the next request runs again
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_leader_fails_waiters():
+    flight = SingleFlight(window=0)
+    fn, _ = counting_call({"intents": []}, delay=1)
+
+    async def run():
+        leader = asyncio.ensure_future(flight.run("bark", fn))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.run("bark", fn))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    leader, follower = asyncio.run(run())
+    assert isinstance(leader, asyncio.CancelledError)
+    # The follower fails like any other error instead of being cancelled itself
+    assert isinstance(follower, RuntimeError)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,180 @@
+"""
+Pins cache_llm.TemplateCache / PersistentTemplateCache behaviour: LRU
+eviction order, TTL expiry and sweeping, namespace purge when the prompt
+or model fingerprint changes, and warm load from SQLite.
+
+    python TESTS/test_template_cache.py      (or pytest TESTS/test_template_cache.py)
+"""
+import inspect
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_llm import TemplateCache, PersistentTemplateCache, cache_namespace, entry_size
+
+
+def template(action):
+    return {"intents": [{"type": "hat", "action": action}]}
+
+
+def fill(cache, *keys):
+    for key in keys:
+        cache.put(key, template(key))
+        # Distinct wall-clock stored_at for the SQLite ordering
+        time.sleep(0.002)
+
+
+def test_lru_eviction_order():
+    cache = TemplateCache(max_entries=3)
+    fill(cache, "sit", "bark", "howl")
+    assert cache.get("sit") == template("sit")
+    fill(cache, "wag")
+    # "bark" was least recently used; "sit" was refreshed by get()
+    assert [key for key, _ in cache.items()] == ["howl", "sit", "wag"]
+    assert cache.get("bark") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_max_bytes_evicts_least_recently_used():
+    # Same-length keys, so every entry has the same size
+    cache = TemplateCache(max_entries=100, max_bytes=2 * entry_size("sit", template("sit")))
+    fill(cache, "sit", "bar", "how")
+    assert [key for key, _ in cache.items()] == ["bar", "how"]
+    assert cache.bytes == cache.max_bytes
+    # Larger than the whole budget: not stored at all
+    cache.put("huge", {"intents": [{"type": "chat", "text": "x" * cache.max_bytes}]})
+    assert cache.get("huge") is None and len(cache) == 2
+
+
+def test_put_replaces_existing_key():
+    cache = TemplateCache(max_entries=2)
+    fill(cache, "sit", "bark")
+    cache.put("sit", template("howl"))
+    assert len(cache) == 2
+    assert cache.get("sit") == template("howl")
+    assert [key for key, _ in cache.items()] == ["bark", "sit"]
+
+
+def test_ttl_expiry_on_lookup():
+    cache = TemplateCache(ttl=0.05)
+    fill(cache, "sit")
+    assert cache.get("sit") == template("sit")
+    time.sleep(0.06)
+    assert cache.get("sit") is None
+    assert len(cache) == 0
+    stats = cache.stats()
+    assert stats["expirations"] == 1 and stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_sweep_drops_only_expired_entries():
+    cache = TemplateCache(ttl=0.05, sweep_interval=3600)
+    fill(cache, "sit", "bark")
+    time.sleep(0.06)
+    fill(cache, "howl")
+    cache.sweep()
+    assert [key for key, _ in cache.items()] == ["howl"]
+    assert cache.stats()["expirations"] == 2
+
+
+def test_sweep_runs_proactively_on_access():
+    cache = TemplateCache(ttl=0.05, sweep_interval=0.05)
+    fill(cache, "sit", "bark")
+    time.sleep(0.06)
+    # A lookup of a different key sweeps the expired ones
+    assert cache.get("howl") is None
+    assert len(cache) == 0 and cache.bytes == 0
+
+
+def test_warm_load_from_sqlite(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    namespace = cache_namespace("prompt", "model")
+    cache = PersistentTemplateCache(path, namespace)
+    fill(cache, "sit", "bark", "howl")
+    cache.close()
+
+    cache = PersistentTemplateCache(path, namespace)
+    # Newest entries are the most recently used
+    assert cache.items() == [(key, template(key)) for key in ("sit", "bark", "howl")]
+    assert cache.get("bark") == template("bark")
+    cache.close()
+
+
+def test_warm_load_keeps_the_newest_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = PersistentTemplateCache(path, "ns")
+    fill(cache, "sit", "bark", "howl")
+    cache.close()
+
+    cache = PersistentTemplateCache(path, "ns", max_entries=2)
+    assert [key for key, _ in cache.items()] == ["bark", "howl"]
+    cache.close()
+
+
+def test_evicted_and_expired_entries_are_not_warm_loaded(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = PersistentTemplateCache(path, "ns", max_entries=2)
+    fill(cache, "sit", "bark", "howl")
+    cache.close()
+    cache = PersistentTemplateCache(path, "ns")
+    assert [key for key, _ in cache.items()] == ["bark", "howl"]
+    cache.close()
+
+    cache = PersistentTemplateCache(path, "ns", ttl=0.05)
+    time.sleep(0.06)
+    cache.close()
+    cache = PersistentTemplateCache(path, "ns", ttl=0.05)
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_namespace_change_purges_old_rows(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    old = cache_namespace("prompt v1", "model")
+    new = cache_namespace("prompt v2", "model")
+    assert old != new
+
+    cache = PersistentTemplateCache(path, old)
+    fill(cache, "sit", "bark")
+    cache.close()
+
+    cache = PersistentTemplateCache(path, new)
+    assert len(cache) == 0
+    fill(cache, "howl")
+    cache.close()
+
+    db = sqlite3.connect(path)
+    rows = db.execute("SELECT namespace, key FROM templates").fetchall()
+    db.close()
+    assert rows == [(new, "howl")]
+
+    # Going back to the old prompt does not resurrect its entries
+    cache = PersistentTemplateCache(path, old)
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_clear_removes_persisted_rows(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = PersistentTemplateCache(path, "ns")
+    fill(cache, "sit")
+    cache.clear()
+    cache.close()
+    cache = PersistentTemplateCache(path, "ns")
+    assert len(cache) == 0
+    cache.close()
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            if "tmp_path" in inspect.signature(test).parameters:
+                with tempfile.TemporaryDirectory() as tmp:
+                    test(Path(tmp))
+            else:
+                test()
+            print(f"ok  {name}")
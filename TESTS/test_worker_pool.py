@@ -0,0 +1,228 @@
+"""
+Pins intent_worker_pool.OrderedWorkerPool behaviour: per-source emit order,
+the overload and stale policies, and the outcome each submit() future
+resolves with.
+
+    python TESTS/test_worker_pool.py      (or pytest TESTS/test_worker_pool.py)
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_worker_pool import (
+    OrderedWorkerPool, EMITTED, NO_OUTPUT, FAILED, DROPPED_STALE, DROPPED_OVERFLOW, COALESCED,
+)
+
+
+def make_pool(delays=None, **kwargs):
+    """Pool whose process_fn sleeps delays[payload] seconds and echoes the payload."""
+    delays = delays or {}
+    processed = []
+    emitted = []
+
+    async def process(source, payload):
+        processed.append(payload)
+        await asyncio.sleep(delays.get(payload, 0))
+        if payload == "fail":
+            raise RuntimeError("boom")
+        return None if payload == "quiet" else payload
+
+    async def emit(source, result):
+        emitted.append((source, result))
+
+    return OrderedWorkerPool(process, emit, **kwargs), processed, emitted
+
+
+async def drain(pool, futures):
+    outcomes = await asyncio.gather(*futures)
+    await pool.stop()
+    return outcomes
+
+
+def test_emits_in_arrival_order_per_source():
+    async def run():
+        # Earlier messages take longest, so they complete out of order
+        pool, _, emitted = make_pool({"a1": 0.05, "a2": 0.03, "b1": 0.0}, workers=4)
+        pool.start()
+        futures = [await pool.submit("a", "a1"), await pool.submit("a", "a2"),
+                   await pool.submit("b", "b1"), await pool.submit("a", "a3")]
+        outcomes = await drain(pool, futures)
+        return emitted, outcomes
+
+    emitted, outcomes = asyncio.run(run())
+    assert [result for source, result in emitted if source == "a"] == ["a1", "a2", "a3"]
+    # Another source never waits behind a slow one
+    assert emitted[0] == ("b", "b1")
+    assert outcomes == [EMITTED] * 4
+
+
+def test_outcomes():
+    async def run():
+        pool, _, emitted = make_pool(workers=2)
+        pool.start()
+        futures = [await pool.submit("a", payload) for payload in ("ok", "quiet", "fail", "after")]
+        outcomes = await drain(pool, futures)
+        return emitted, outcomes, pool.stats()
+
+    emitted, outcomes, stats = asyncio.run(run())
+    assert outcomes == [EMITTED, NO_OUTPUT, FAILED, EMITTED]
+    # A failed message does not hold up its source
+    assert emitted == [("a", "ok"), ("a", "after")]
+    assert stats["failed"] == 1 and stats["processed"] == 2
+
+
+def test_streaming_outcomes():
+    async def process(source, payload):
+        if payload == "fail":
+            yield "partial"
+            raise RuntimeError("boom")
+        for item in payload.split():
+            yield item
+
+    emitted = []
+
+    async def emit(source, item):
+        emitted.append(item)
+
+    async def run():
+        pool = OrderedWorkerPool(process, emit, workers=2)
+        pool.start()
+        futures = [await pool.submit("a", payload) for payload in ("sit bark", "", "fail")]
+        return await drain(pool, futures)
+
+    assert asyncio.run(run()) == [EMITTED, NO_OUTPUT, FAILED]
+    assert emitted == ["sit", "bark", "partial"]
+
+
+def test_pool_survives_a_new_event_loop():
+    # Built outside any loop (as at import time) and used from two asyncio.run() calls
+    pool, _, emitted = make_pool()
+
+    async def run(payload):
+        pool.start()
+        future = await pool.submit("a", payload)
+        await pool.join()
+        outcome = await future
+        await pool.stop()
+        return outcome
+
+    assert asyncio.run(run("first")) == EMITTED
+    assert asyncio.run(run("second")) == EMITTED
+    assert emitted == [("a", "first"), ("a", "second")]
+
+
+def test_overload_block_waits_for_room():
+    async def run():
+        pool, _, emitted = make_pool(max_queue=1, overload="block")
+        first = await pool.submit("a", "a1")
+        second = asyncio.ensure_future(pool.submit("a", "a2"))
+        await asyncio.sleep(0.02)
+        blocked = not second.done()
+        pool.start()
+        outcomes = await drain(pool, [first, await second])
+        return blocked, emitted, outcomes
+
+    blocked, emitted, outcomes = asyncio.run(run())
+    assert blocked
+    assert emitted == [("a", "a1"), ("a", "a2")]
+    assert outcomes == [EMITTED, EMITTED]
+
+
+def test_overload_drop_oldest():
+    async def run():
+        pool, _, emitted = make_pool(max_queue=2, overload="drop_oldest", priorities={"keybd": 0})
+        futures = [await pool.submit("keybd", "k1"), await pool.submit("stt", "s1"),
+                   await pool.submit("stt", "s2")]
+        pool.start()
+        return emitted, await drain(pool, futures), pool.stats()
+
+    emitted, outcomes, stats = asyncio.run(run())
+    # The oldest message of the least important priority goes, not the older keybd one
+    assert outcomes == [EMITTED, DROPPED_OVERFLOW, EMITTED]
+    assert emitted == [("keybd", "k1"), ("stt", "s2")]
+    assert stats["dropped_overflow"] == 1
+
+
+def test_overload_drop_newest():
+    async def run():
+        pool, _, emitted = make_pool(max_queue=2, overload="drop_newest")
+        futures = [await pool.submit("a", payload) for payload in ("a1", "a2", "a3")]
+        shed = futures[2].done()
+        pool.start()
+        return shed, emitted, await drain(pool, futures)
+
+    shed, emitted, outcomes = asyncio.run(run())
+    assert shed
+    assert outcomes == [EMITTED, EMITTED, DROPPED_OVERFLOW]
+    assert emitted == [("a", "a1"), ("a", "a2")]
+
+
+def test_overload_coalesce():
+    async def run():
+        pool, _, emitted = make_pool(max_queue=2, overload="coalesce")
+        futures = [await pool.submit("a", "sit"), await pool.submit("b", "bark"),
+                   await pool.submit("a", "howl"),
+                   # No queued message from "c": falls back to drop_oldest
+                   await pool.submit("c", "wag")]
+        pool.start()
+        return emitted, await drain(pool, futures), pool.stats()
+
+    emitted, outcomes, stats = asyncio.run(run())
+    assert outcomes == [DROPPED_OVERFLOW, EMITTED, COALESCED, EMITTED]
+    assert sorted(emitted) == [("b", "bark"), ("c", "wag")]
+    assert stats["coalesced"] == 1 and stats["dropped_overflow"] == 1
+
+
+def test_overload_coalesce_merges_text():
+    async def run():
+        pool, _, emitted = make_pool(max_queue=1, overload="coalesce")
+        futures = [await pool.submit("a", "sit"), await pool.submit("a", "bark")]
+        pool.start()
+        return emitted, await drain(pool, futures)
+
+    emitted, outcomes = asyncio.run(run())
+    assert emitted == [("a", "sit. bark")]
+    assert outcomes == [EMITTED, COALESCED]
+
+
+def test_stale_messages_are_dropped():
+    async def run():
+        pool, processed, emitted = make_pool(max_age=0.02, stale="drop")
+        stale = await pool.submit("a", "old")
+        await asyncio.sleep(0.05)
+        fresh = await pool.submit("a", "new")
+        pool.start()
+        return processed, emitted, await drain(pool, [stale, fresh])
+
+    processed, emitted, outcomes = asyncio.run(run())
+    assert outcomes == [DROPPED_STALE, EMITTED]
+    assert processed == ["new"] and emitted == [("a", "new")]
+
+
+def test_stale_messages_are_demoted():
+    async def run():
+        pool, processed, emitted = make_pool(workers=1, max_age=0.02, stale="demote")
+        stale = [await pool.submit("a", "a-old"), await pool.submit("b", "b-old")]
+        await asyncio.sleep(0.05)
+        fresh = [await pool.submit("a", "a-new"), await pool.submit("b", "b-new")]
+        pool.start()
+        return processed, emitted, await drain(pool, stale + fresh), pool.stats()
+
+    processed, emitted, outcomes, stats = asyncio.run(run())
+    # Fresh messages are processed first, stale ones still run afterwards...
+    assert processed[:2] == ["a-new", "b-new"]
+    assert sorted(processed[2:]) == ["a-old", "b-old"]
+    assert outcomes == [EMITTED] * 4
+    assert stats["demoted"] == 2
+    # ...but keep their place in per-source emit order
+    assert [result for source, result in emitted if source == "a"] == ["a-old", "a-new"]
+    assert [result for source, result in emitted if source == "b"] == ["b-old", "b-new"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"ok  {name}")
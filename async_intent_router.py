@@ -1,13 +1,28 @@
 import asyncio
-import json
+import os
 from aiomqtt import Client, MqttError
-from SYSTEM_PROMPT import SYSTEM_PROMPT
+from prompt_registry import get_system_prompt, prompt_budget
+from SYSTEM_PROMPT import PROMPT_RULES
+from example_index import ExampleIndex
+from intent_schema import IntentValidator, INTENTS_SCHEMA
 #from BANANA_PROMPT import SYSTEM_PROMPT
 
 from llm_intent_processor import LLMIntentProcessor
-from ollama_client import OllamaClient as LLMClient
+from ollama_client import AsyncOllamaClient as LLMClient
+#from hailo_ollama import AsyncHailoClient as LLMClient
 from text_preprocessor import preprocess_text_for_model
 from normalisation_rules import normalise_object
+from intent_worker_pool import OrderedWorkerPool
+from fast_path import RuleBasedClassifier
+from single_flight import SingleFlight
+from micro_batch import MicroBatcher
+from multi_backend import MultiBackendClient
+from hailo_ollama import AsyncHailoClient
+#from gemini_client import AsyncGeminiClient
+from metrics import Metrics, serve_metrics
+from intent_publisher import IntentPublisher
+from cache_llm import (IntentTemplateCache, TemplateCache, PersistentTemplateCache, cache_namespace, llm_fingerprint,
+                       normalise)
 
 # MQTT settings
 MQTT_BROKER = "localhost"
@@ -24,58 +39,227 @@ LLM_MODEL = "gemma3:4b"
 # Commands are sourced from SST or keyboard through MQTT topics and their payload
 SUB_TOPICS = ["stt/text","keybd/text"]
 
+# Number of utterances parsed concurrently (match to LLM replicas / backend capacity)
+WORKER_COUNT = 4
+
+# Ingress queue: lower priority value is parsed first, so typed commands preempt speech
+SOURCE_PRIORITY = {"keybd/text": 0, "stt/text": 1}
+INGRESS_QUEUE_SIZE = 32
+OVERLOAD_POLICY = "drop_oldest"     # block | drop_oldest | drop_newest | coalesce
+MAX_UTTERANCE_AGE = 10              # seconds; older commands are no longer what the user wants
+STALE_POLICY = "drop"               # drop | demote
+
+# Stream LLM output and publish each intent as soon as it is complete
+STREAM_INTENTS = True
+
 PUB_TOPICS = {
     "hat": "intent/hat",
     "zigbee": "intent/zigbee",
     "chat": "intent/chat"
 }
+PUBLISH_QOS = 1
+# One {"intents": [...]} message per topic per utterance instead of one per intent
+# (needs STREAM_INTENTS = False, streamed intents are published as they arrive)
+PACK_INTENTS = False
+
+# Prompt variant per model (model_capabilities "prompt_variant"): compact for 4b+, full for 1b
+SYSTEM_PROMPT = get_system_prompt(LLM_MODEL)
+print(f"System prompt for {LLM_MODEL}: {prompt_budget(LLM_MODEL)}")
+
+# Send the fixed rules plus only the EXAMPLE_COUNT bank examples most similar to each
+# utterance, instead of every hand-written example, so prompt size stays flat as the bank grows
+USE_EXAMPLE_INDEX = False
+EXAMPLE_COUNT = 3
+example_index = ExampleIndex(k=EXAMPLE_COUNT) if USE_EXAMPLE_INDEX else None
+if example_index:
+    SYSTEM_PROMPT = PROMPT_RULES
+    print(f"Example index: {len(example_index)} examples, {EXAMPLE_COUNT} per request")
+
+# Send SYSTEM_PROMPT as a fixed /api/chat system message so the server reuses its evaluated
+# KV prefix; only the user text is evaluated per request while the prefix stays cached
+REUSE_PROMPT_PREFIX = True
+
+
+# Per-stage latency histograms and counters, served as Prometheus text on METRICS_PORT/metrics.
+# Localhost only unless METRICS_HOST is opened up (e.g. "0.0.0.0" for a remote scraper)
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+metrics = Metrics(enabled=METRICS_ENABLED)
+
+
+def print_timings(model: str, timings: dict):
+    print(f"LLM {model}: prompt eval {timings['prompt_eval_ms']} ms "
+          f"({timings['prompt_eval_count']} tokens), generation {timings['eval_ms']} ms")
+    # Server-side split of the LLM stage
+    metrics.observe("llm_prompt_eval", timings["prompt_eval_ms"] / 1000, model=model)
+    metrics.observe("llm_generation", timings["eval_ms"] / 1000, model=model)
+
+
+# Pack up to MICRO_BATCH_SIZE utterances arriving within MICRO_BATCH_WINDOW seconds into one
+# LLM call. Batched results are not streamed, so this replaces STREAM_INTENTS when enabled.
+USE_MICRO_BATCH = False
+MICRO_BATCH_SIZE = WORKER_COUNT
+MICRO_BATCH_WINDOW = 0.05  # seconds
+
+# Send each request to the fastest healthy backend, hedging to the next one when the
+# primary is slower than its p90 and failing over on errors / timeouts
+USE_MULTI_BACKEND = False
+HAILO_SERVER = "http://aiplus2.local:8000"
+HAILO_MODEL = "llama3.2:3b"
+HEDGE_REQUESTS = True
+LLM_TIMEOUT = 30  # seconds
+
+# Constrain generation to the intents JSON schema (Ollama `format`) and check / repair every
+# LLM result locally; invalid fields and intents are dropped, never re-asked. Micro-batch
+# replies have their own {"results": [...]} shape, so the schema is not sent with batching.
+USE_OUTPUT_SCHEMA = True
+output_schema = INTENTS_SCHEMA if USE_OUTPUT_SCHEMA and not USE_MICRO_BATCH else None
+validator = IntentValidator() if USE_OUTPUT_SCHEMA else None
 
 # LLM setup
-llm = LLMClient(SYSTEM_PROMPT, model=LLM_MODEL, host=LLM_SERVER)
+llm = LLMClient(SYSTEM_PROMPT, model=LLM_MODEL, host=LLM_SERVER,
+                reuse_prefix=REUSE_PROMPT_PREFIX, on_timings=print_timings, metrics=metrics,
+                examples=example_index, schema=output_schema)
+if USE_MULTI_BACKEND:
+    llm = MultiBackendClient({
+        "hailo": AsyncHailoClient(get_system_prompt(HAILO_MODEL), model=HAILO_MODEL, host=HAILO_SERVER,
+                                  on_timings=print_timings, metrics=metrics, schema=output_schema),
+        "ollama": llm,
+        #"gemini": AsyncGeminiClient(get_system_prompt("gemini-alpha"), api_key=os.environ["GOOGLE_API_KEY"]),
+    }, hedge=HEDGE_REQUESTS, timeout=LLM_TIMEOUT)
+if USE_MICRO_BATCH:
+    llm = MicroBatcher(llm, max_batch=MICRO_BATCH_SIZE, window=MICRO_BATCH_WINDOW)
 
-llm_processor = LLMIntentProcessor(llm, preprocess_text_for_model, normalise_object)
+# Utterances of an already-seen shape (only numbers / colours / say text differ) skip the LLM
+USE_TEMPLATE_CACHE = True
+CACHE_MAX_ENTRIES = 2048
+CACHE_MAX_BYTES = 2 * 1024 * 1024
+CACHE_TTL = 24 * 3600  # seconds
 
+# SQLite file so the cache survives restarts (None = memory only).
+# Entries are keyed by a hash of the prompt (plus the example bank) and model of every
+# backend that can answer, so prompt/model/backend changes start fresh.
+# INTENT_CACHE_DB overrides the path; empty keeps the cache in memory (load tests, mock servers).
+CACHE_DB_PATH = os.environ.get("INTENT_CACHE_DB", "intent_cache.sqlite3") or None
 
-async def handle_message(msg: str):
-    """Preprocess text, get intents from LLM, publish per type."""
+
+def make_template_cache():
+    limits = dict(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL)
+    if CACHE_DB_PATH:
+        return PersistentTemplateCache(CACHE_DB_PATH, cache_namespace(llm_fingerprint(llm), LLM_MODEL), **limits)
+    return TemplateCache(**limits)
+
+
+# Paraphrases of a cached command ("make the lamp blue" after "turn the lamp blue") reuse its
+# template when they have the same content words per clause, up to stopwords, word order and
+# aliases (semantic_cache.signature). Check with TESTS/semantic_cache_report.py.
+USE_SEMANTIC_CACHE = False
+
+
+def make_semantic_cache():
+    from semantic_cache import SemanticIntentCache
+    return SemanticIntentCache(max_entries=CACHE_MAX_ENTRIES)
+
+
+intent_cache = IntentTemplateCache(
+    make_template_cache(), semantic=make_semantic_cache() if USE_SEMANTIC_CACHE else None
+) if USE_TEMPLATE_CACHE else None
+
+# Simple, unambiguous HAT commands ("bark", "turn neo lights red") are answered by rules, no LLM
+USE_FAST_PATH = True
+fast_path = RuleBasedClassifier() if USE_FAST_PATH else None
+
+# Identical utterances in flight share one LLM call. Copies arriving within DUPLICATE_WINDOW
+# seconds of the first (QoS 1 redelivery, same text on stt and keybd) are not re-published.
+DUPLICATE_WINDOW = 2.0  # seconds, 0 = always re-publish
+single_flight = SingleFlight(window=DUPLICATE_WINDOW, key_fn=normalise)
+
+publisher = IntentPublisher(topics=PUB_TOPICS, qos=PUBLISH_QOS, pack=PACK_INTENTS, metrics=metrics)
+
+llm_processor = LLMIntentProcessor(llm, preprocess_text_for_model, normalise_object,
+                                   cache=intent_cache, fast_path=fast_path, coalesce=single_flight,
+                                   metrics=metrics, validator=validator)
+
+
+async def process_message(source: str, msg: str) -> dict:
+    """Preprocess text and get intents from LLM. Runs concurrently in the worker pool."""
     #clean_text = preprocess_text_for_model(msg, MODEL_NAME)
-    print(f"\nReceived text: {msg}")
+    print(f"\nReceived text on {source}: {msg} {worker_pool.stats()}")
+    if fast_path:
+        print(f"Fast path: {fast_path.stats()}")
+    print(f"Duplicates: {single_flight.stats()}")
     #print(f"Cleaned text: {clean_text}")
 
-    intents = llm_processor.handle_text(msg)
+    # Awaiting the async client lets the MQTT loop keep running during inference
+    return await llm_processor.handle_text_async(msg)
+
+
+async def stream_message(source: str, msg: str):
+    """Streaming process_message: yields each intent as soon as the LLM completes it."""
+    print(f"\nReceived text on {source}: {msg} {worker_pool.stats()}")
+    if fast_path:
+        print(f"Fast path: {fast_path.stats()}")
+    print(f"Duplicates: {single_flight.stats()}")
+
+    async for intent in llm_processor.stream_text_async(msg):
+        yield intent
+
+
+async def publish_intent(source: str, intent: dict):
+    """Queue a single intent for the topic for its type; order per topic is kept."""
+    publisher.publish(intent)
+
+
+async def publish_intents(source: str, intents: dict):
+    """Publish intents per type. Called in arrival order for each source."""
     print(intents)
+    await publisher.publish_intents(intents)
+
+
+async def handle_message(msg: str, source: str = "direct"):
+    """Preprocess text, get intents from LLM, publish per type."""
+    intents = await process_message(source, msg)
+    if intents is None:
+        # Duplicate suppressed by single_flight (counted by the processor): the first copy has been published
+        return
+    await publish_intents(source, intents)
 
-    for intent in intents.get("intents", []):
-        intent_type = intent.get("type", "").lower()
-        topic = PUB_TOPICS.get(intent_type)
-        if topic:
-            print("Topic", topic, "MESSAGE", intent)
-            print(json.dumps(intent, indent=2))
 
-    #        payload = json.dumps(intent)
-    #        await mqtt_client.publish(topic, payload)
-    #        print(f"Published to {topic}: {payload}")
+# Up to WORKER_COUNT utterances are parsed at once, output stays ordered per topic.
+# With STREAM_INTENTS each intent is dispatched as soon as the LLM has generated it.
+ingress = dict(workers=WORKER_COUNT, max_queue=INGRESS_QUEUE_SIZE, priorities=SOURCE_PRIORITY,
+               overload=OVERLOAD_POLICY, max_age=MAX_UTTERANCE_AGE, stale=STALE_POLICY)
+if STREAM_INTENTS:
+    worker_pool = OrderedWorkerPool(stream_message, publish_intent, **ingress)
+else:
+    worker_pool = OrderedWorkerPool(process_message, publish_intents, **ingress)
 
 
 async def mqtt_loop():
     """Main MQTT loop with automatic reconnects."""
     global mqtt_client
     mqtt_client = Client(MQTT_BROKER, MQTT_PORT)
+    worker_pool.start()
+    if METRICS_ENABLED and METRICS_PORT:
+        await serve_metrics(metrics, host=METRICS_HOST, port=METRICS_PORT)
+        print(f"Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
 
     while True:
         try:
             async with mqtt_client as client:
+                publisher.client = client
                 for topic in SUB_TOPICS:
                     await client.subscribe(topic)
                 async for message in client.messages:
                     payload = message.payload.decode()
-                    await handle_message(payload)
+                    await worker_pool.submit(str(message.topic), payload)
 
         except MqttError as error:
             print(f"MQTT Error: {error}, reconnecting in 5 seconds...")
             await asyncio.sleep(5)
 
-        asyncio.sleep(1)
+        await asyncio.sleep(1)
 
 
 if __name__ == "__main__":
@@ -1,23 +1,209 @@
+import hashlib
+import json
 import re
-from time import time
+import sqlite3
+from collections import OrderedDict
+from time import monotonic, time
 
 # -------------------------------
 # Cache for templates
 # -------------------------------
-TEMPLATE_CACHE = {}
-CACHE_TTL = 3600  # seconds
+DEFAULT_CACHE_TTL = 3600  # seconds
+
+class TemplateCache:
+    """
+    Bounded LRU + TTL cache.
+    - max_entries / max_bytes: least recently used entries are evicted first
+    - ttl: entries expire ttl seconds after they were stored; expired entries
+      are swept proactively every sweep_interval seconds, not only on lookup
+    - hits / misses / evictions / expirations counters via stats()
+    """
+    def __init__(self, max_entries=1024, max_bytes=1024 * 1024, ttl=DEFAULT_CACHE_TTL, sweep_interval=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._entries = OrderedDict()   # key -> (template, size), LRU order
+        self._stored_at = OrderedDict() # key -> timestamp, expiry order
+        self._last_sweep = monotonic()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        now = monotonic()
+        self._maybe_sweep(now)
+        entry = self._entries.get(key)
+        if entry is None or now - self._stored_at[key] >= self.ttl:
+            if entry is not None:
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, template):
+        now = monotonic()
+        self._maybe_sweep(now)
+        self._insert(key, template, now)
+
+    def _insert(self, key, template, stored_at):
+        size = entry_size(key, template)
+        if size > self.max_bytes:
+            return False
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (template, size)
+        self._stored_at[key] = stored_at
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return True
+
+    def sweep(self, now=None):
+        """Drop every expired entry. Cost is proportional to the number expired."""
+        now = monotonic() if now is None else now
+        self._last_sweep = now
+        while self._stored_at:
+            key, stored_at = next(iter(self._stored_at.items()))
+            if now - stored_at < self.ttl:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._stored_at.clear()
+        self.bytes = 0
+
+    def items(self):
+        """(key, template) pairs, least recently used first."""
+        return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _maybe_sweep(self, now):
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+    def _remove(self, key):
+        _, size = self._entries.pop(key)
+        del self._stored_at[key]
+        self.bytes -= size
+
+def entry_size(key, template):
+    # Approximate footprint: serialised size is stable and cheap enough on store
+    return len(str(key)) + len(json.dumps(template, default=str))
+
+def cache_namespace(prompt: str, model: str) -> str:
+    """Editing the prompt or switching model gives a new namespace, invalidating old entries."""
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+
+def llm_fingerprint(client) -> str:
+    """
+    Prompt text behind a client, for cache_namespace. A MultiBackendClient
+    lists every backend's model and prompt, since any of them may answer;
+    a wrapper with an inner `llm` (MicroBatcher) uses that client's.
+    """
+    backends = getattr(client, "backends", None)
+    if backends is not None:
+        return "\n".join(f"[{b.name} {b.client.model}]\n{llm_fingerprint(b.client)}" for b in backends)
+    inner = getattr(client, "llm", None)
+    if inner is not None:
+        return llm_fingerprint(inner)
+    prompt = getattr(client, "prompt", None) or getattr(client, "system_prompt", "")
+    examples = getattr(client, "examples", None)
+    return prompt + (examples.fingerprint() if examples else "")
+
+class PersistentTemplateCache(TemplateCache):
+    """
+    TemplateCache backed by SQLite so templates survive restarts.
+    Entries are written through on store and warm-loaded in one query on
+    startup. Only entries from `namespace` (see cache_namespace) are loaded;
+    rows from other namespaces are purged.
+    """
+    def __init__(self, path, namespace, **kwargs):
+        super().__init__(**kwargs)
+        self.namespace = namespace
+        self._loading = False
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS templates ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, template TEXT NOT NULL,"
+            " stored_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._warm_load()
+
+    def _warm_load(self):
+        wall_now, now = time(), monotonic()
+        self.db.execute("DELETE FROM templates WHERE namespace != ?", (self.namespace,))
+        self.db.execute("DELETE FROM templates WHERE stored_at <= ?", (wall_now - self.ttl,))
+        self.db.commit()
+        rows = self.db.execute(
+            "SELECT key, template, stored_at FROM templates WHERE namespace = ?"
+            " ORDER BY stored_at DESC LIMIT ?", (self.namespace, self.max_entries)
+        ).fetchall()
+        # Oldest first, so the newest entries end up most recently used
+        self._loading = True
+        for key, template, stored_at in reversed(rows):
+            self._insert(key, json.loads(template), now - (wall_now - stored_at))
+        self._loading = False
+
+    def put(self, key, template):
+        super().put(key, template)
+        if key in self._entries:
+            self.db.execute(
+                "INSERT OR REPLACE INTO templates (namespace, key, template, stored_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(template), time())
+            )
+        self.db.commit()
+
+    def sweep(self, now=None):
+        super().sweep(now)
+        self.db.commit()
+
+    def clear(self):
+        super().clear()
+        self.db.execute("DELETE FROM templates WHERE namespace = ?", (self.namespace,))
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def _remove(self, key):
+        super()._remove(key)
+        if not self._loading:
+            self.db.execute("DELETE FROM templates WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+TEMPLATE_CACHE = TemplateCache()
 
 def cache_lookup(key):
-    entry = TEMPLATE_CACHE.get(key)
-    if entry:
-        template, timestamp = entry
-        if time() - timestamp < CACHE_TTL:
-            return template
-        del TEMPLATE_CACHE[key]
-    return None
+    return TEMPLATE_CACHE.get(key)
 
 def cache_store(key, template):
-    TEMPLATE_CACHE[key] = (template, time())
+    TEMPLATE_CACHE.put(key, template)
 
 # -------------------------------
 # Action synonyms / multi-word phrases
@@ -25,6 +211,8 @@ def cache_store(key, template):
 ACTION_SYNONYMS = {
     "woof": "bark",
     "shake the paw": "shake_paw",
+    "shake your paw": "shake_paw",
+    "shake paw": "shake_paw",
     "wag your tail": "wag_tail",
     "wag tail": "wag_tail",
     "spin around": "spin",
@@ -49,21 +237,68 @@ COUNTED_ACTIONS = {"wag_tail", "shake_paw", "spin", "scratch", "scratch_head", "
 # -------------------------------
 # Normalisation
 # -------------------------------
+def compile_alternation(words):
+    """
+    Compile words into one \b-bounded regex built from a prefix trie.
+    Shared prefixes are matched once and the longest word always wins, so a
+    single scan replaces one regex pass per word.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return re.compile(r"\b(?:" + _trie_pattern(trie) + r")\b")
+
+def _trie_pattern(node):
+    ends_here = "" in node
+    alts = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not alts:
+        return ""
+    body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+    if ends_here:
+        return ("(?:" + body + ")?") if len(alts) == 1 else body + "?"
+    return body
+
+class PhraseNormaliser:
+    """
+    Replaces every phrase of a synonym table in one pass.
+    The matcher is rebuilt only when the table's contents change.
+    """
+    def __init__(self, table):
+        self.table = table
+        self._snapshot = None
+        self._pattern = None
+
+    def _compiled(self):
+        if self._snapshot != self.table:
+            self._snapshot = dict(self.table)
+            self._pattern = compile_alternation(self._snapshot) if self._snapshot else None
+        return self._pattern
+
+    def __call__(self, text: str) -> str:
+        pattern = self._compiled()
+        if pattern is None:
+            return text
+        table = self._snapshot
+        return pattern.sub(lambda m: table[m.group(0)], text)
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s.!?]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+replace_action_synonyms = PhraseNormaliser(ACTION_SYNONYMS)
+
 def normalise(text: str) -> str:
     """
     Normalise text:
     - lowercase, remove punctuation except sentence delimiters
-    - map multi-word phrases to canonical actions
+    - map multi-word phrases to canonical actions (single pass, longest match)
     - collapse whitespace
     """
     text = text.lower()
-    text = re.sub(r"[^\w\s.!?]", "", text)
-    # Replace multi-word phrases first
-    sorted_phrases = sorted(ACTION_SYNONYMS.keys(), key=len, reverse=True)
-    for phrase in sorted_phrases:
-        pattern = r"\b" + re.escape(phrase) + r"\b"
-        text = re.sub(pattern, ACTION_SYNONYMS[phrase], text)
-    text = re.sub(r"\s+", " ", text)
+    text = PUNCTUATION_PATTERN.sub("", text)
+    text = replace_action_synonyms(text)
+    text = WHITESPACE_PATTERN.sub(" ", text)
     return text.strip()
 
 # -------------------------------
@@ -80,52 +315,71 @@ def extract_numbers_and_replace(text):
 # -------------------------------
 # Parse actions into structured template
 # -------------------------------
-def parse_actions(template_text):
-    action_list = []
-
-    # Split on 'and', '.', '!', '?' and also detect known action names sequentially
-    splits = []
-    # Add spaces around known actions to help splitting
-    temp_text = template_text
-    for act in CANONICAL_ACTIONS:
-        temp_text = re.sub(rf"\b{act}\b", f"|||{act}", temp_text)
-    splits = [s.strip() for s in temp_text.split("|||") if s.strip()]
-
-    for action_str in splits:
-        # Identify which canonical action this is
-        action_match = None
-        for act in CANONICAL_ACTIONS:
-            if action_str.startswith(act):
-                action_match = act
-                break
-        if not action_match:
-            continue
-
-        action_name = action_match
-        placeholders = re.findall(r"<VAR\d+>", action_str)
-        params = {}
-
-        if action_name == "say":
-            # Take the rest of the string after "say" as text placeholder
-            params["text"] = "<TEXT>"
-        else:
-            for i, ph in enumerate(placeholders):
-                if action_name in TIMED_ACTIONS:
-                    if i == 0:
-                        params["duration"] = ph
-                    else:
-                        params[f"count{i}"] = ph
-                elif action_name in COUNTED_ACTIONS:
-                    if i == 0:
-                        params["count1"] = ph
-                    else:
-                        params[f"count{i+1}"] = ph
-                else:
-                    params[f"param{i+1}"] = ph
+class ActionTokenizer:
+    """
+    Single-pass tokenizer for template text. One regex, built from
+    CANONICAL_ACTIONS, yields actions and <VARn> placeholders in order, so
+    cost is linear in the text no matter how many actions are known.
+    Rebuilt only when the action tables change.
+    """
+    def __init__(self, actions, timed, counted):
+        self.actions = actions
+        self.timed = timed
+        self.counted = counted
+        self._snapshot = None
+        self._pattern = None
+        self._kinds = None
+
+    def _compiled(self):
+        snapshot = (tuple(self.actions), frozenset(self.timed), frozenset(self.counted))
+        if snapshot != self._snapshot:
+            self._snapshot = snapshot
+            actions = compile_alternation(self.actions).pattern
+            self._pattern = re.compile(rf"(?P<action>{actions})|(?P<var><VAR\d+>)")
+            self._kinds = {
+                act: "timed" if act in self.timed else "counted" if act in self.counted else "other"
+                for act in self.actions
+            }
+        return self._pattern, self._kinds
 
-        action_list.append({"action": action_name, "parameters": params})
+    def __call__(self, template_text):
+        pattern, kinds = self._compiled()
+        action_list = []
+        params = None
+        kind = None
+        n_vars = 0
 
-    return action_list
+        for match in pattern.finditer(template_text):
+            action_name = match.group("action")
+            if action_name:
+                params = {}
+                kind = kinds[action_name]
+                n_vars = 0
+                if action_name == "say":
+                    # Take the rest of the string after "say" as text placeholder
+                    params["text"] = "<TEXT>"
+                    kind = "say"
+                action_list.append({"action": action_name, "parameters": params})
+                continue
+
+            # placeholder - belongs to the most recent action, if any
+            if params is None or kind == "say":
+                continue
+            ph = match.group("var")
+            if kind == "timed":
+                params["duration" if n_vars == 0 else f"count{n_vars}"] = ph
+            elif kind == "counted":
+                params[f"count{n_vars + 1}"] = ph
+            else:
+                params[f"param{n_vars + 1}"] = ph
+            n_vars += 1
+
+        return action_list
+
+tokenize_actions = ActionTokenizer(CANONICAL_ACTIONS, TIMED_ACTIONS, COUNTED_ACTIONS)
+
+def parse_actions(template_text):
+    return tokenize_actions(template_text)
 
 # -------------------------------
 # Mock LLM call
@@ -163,16 +417,9 @@ def fill_template(template, numbers, text=None, defaults=None):
     return filled
 
 # -------------------------------
-# Full route_command function
+# Extract SAY text (from RAW text, so case and punctuation survive)
 # -------------------------------
-def route_command(raw_text: str, defaults=None):
-    if defaults is None:
-        defaults = {"duration": 5}
-
-    # 1. Normalise (intent only)
-    norm_text = normalise(raw_text)
-
-    # 2. Extract SAY text FIRST (from RAW text)
+def extract_say_text(raw_text, norm_text):
     say_text = None
     say_match = re.search(r"\bsay\b", norm_text)
     if say_match:
@@ -183,6 +430,20 @@ def route_command(raw_text: str, defaults=None):
 
         # Replace EVERYTHING after 'say' in the normalised string
         norm_text = norm_text[:say_match.start()] + "say <TEXT>"
+    return norm_text, say_text
+
+# -------------------------------
+# Full route_command function
+# -------------------------------
+def route_command(raw_text: str, defaults=None):
+    if defaults is None:
+        defaults = {"duration": 5}
+
+    # 1. Normalise (intent only)
+    norm_text = normalise(raw_text)
+
+    # 2. Extract SAY text FIRST (from RAW text)
+    norm_text, say_text = extract_say_text(raw_text, norm_text)
 
     # 3. Extract numbers AFTER say replacement
     template_text, numbers = extract_numbers_and_replace(norm_text)
@@ -190,7 +451,6 @@ def route_command(raw_text: str, defaults=None):
     # 4. Cache lookup (intent-only key)
     cached_template = cache_lookup(template_text)
     if cached_template:
-        print("*CACHE HIT*")
         return fill_template(
             cached_template,
             numbers,
@@ -201,7 +461,6 @@ def route_command(raw_text: str, defaults=None):
     # 5. First time → build template (LLM or rule-based)
     template = call_llm_for_template(template_text)
     cache_store(template_text, template)
-    print("*CACHE MISS*")
     return fill_template(
         template,
         numbers,
@@ -209,6 +468,161 @@ def route_command(raw_text: str, defaults=None):
         defaults=defaults
     )
 
+# -------------------------------
+# Intent JSON templating for LLMIntentProcessor
+#
+# The real LLM returns {"intents": [...]}. Numbers, colours and say text are
+# lifted out of the utterance as slots, the LLM output is stored with those
+# values replaced by placeholders, and later utterances of the same shape
+# are answered by refilling the template - no LLM call.
+# -------------------------------
+COLOURS = {
+    "red", "green", "blue", "yellow", "orange", "purple", "pink",
+    "white", "cyan", "magenta", "violet", "warm", "cool"
+}
+
+NUMERIC_SLOT_FIELDS = ("delay", "dim", "brightness")
+COLOUR_SLOT_FIELDS = ("colour", "color")
+
+COLOUR_PATTERN = re.compile(r"\b(" + "|".join(sorted(COLOURS)) + r")\b")
+PLACEHOLDER_PATTERN = re.compile(r"<(VAR|COLOUR)(\d+)>")
+
+def extract_slots(text):
+    """
+    Returns (template_key, slots) for an utterance.
+    slots = {"numbers": [...], "colours": [...], "say": str or None}
+    """
+    norm_text = normalise(text)
+    norm_text, say_text = extract_say_text(text, norm_text)
+    template_text, numbers = extract_numbers_and_replace(norm_text)
+
+    colours = []
+    def repl(match):
+        colours.append(match.group(1))
+        return f"<COLOUR{len(colours)}>"
+    template_text = COLOUR_PATTERN.sub(repl, template_text)
+
+    return template_text, {"numbers": numbers, "colours": colours, "say": say_text}
+
+def _same_text(a, b):
+    return a.strip().rstrip(".!?").lower() == b.strip().rstrip(".!?").lower()
+
+def _claim(values, used, value):
+    # First unused slot holding this value, in spoken order
+    for i, v in enumerate(values):
+        if not used[i] and v == value:
+            used[i] = True
+            return i + 1
+    return None
+
+def template_intents(intents_json, slots):
+    """
+    Replace slot values in LLM output with placeholders.
+    Returns None when the output cannot be safely re-filled later, e.g. a
+    derived value (2 minutes -> delay 120) or a slot the LLM did not use.
+    An empty intents list is never a template - it is what failed output
+    looks like, and caching it would replay the failure.
+    """
+    intents = intents_json.get("intents")
+    if not isinstance(intents, list) or not intents or "error" in intents_json:
+        return None
+
+    numbers, colours = slots["numbers"], slots["colours"]
+    used_numbers = [False] * len(numbers)
+    used_colours = [False] * len(colours)
+    say_used = False
+
+    template = []
+    for intent in intents:
+        if not isinstance(intent, dict):
+            return None
+        step = dict(intent)
+        for field in NUMERIC_SLOT_FIELDS:
+            if field in step:
+                value = step[field]
+                if isinstance(value, str) and value.isdigit():
+                    value = int(value)
+                idx = _claim(numbers, used_numbers, value)
+                if idx is None:
+                    return None
+                step[field] = f"<VAR{idx}>"
+        for field in COLOUR_SLOT_FIELDS:
+            if field in step and isinstance(step[field], str) and step[field].lower() in COLOURS:
+                idx = _claim(colours, used_colours, step[field].lower())
+                if idx is None:
+                    return None
+                step[field] = f"<COLOUR{idx}>"
+        if step.get("action") == "say" and "text" in step:
+            if slots["say"] is None or not _same_text(step["text"], slots["say"]):
+                return None
+            step["text"] = "<TEXT>"
+            say_used = True
+        template.append(step)
+
+    if not all(used_numbers) or not all(used_colours) or (slots["say"] is not None and not say_used):
+        return None
+    return template
+
+def _fill_value(value, slots):
+    if value == "<TEXT>":
+        return slots["say"]
+    match = PLACEHOLDER_PATTERN.fullmatch(value) if isinstance(value, str) else None
+    if not match:
+        return value
+    kind, idx = match.group(1), int(match.group(2)) - 1
+    return slots["numbers"][idx] if kind == "VAR" else slots["colours"][idx]
+
+def fill_intents(template, slots):
+    return {"intents": [
+        {field: _fill_value(value, slots) for field, value in step.items()}
+        for step in template
+    ]}
+
+class IntentTemplateCache:
+    """
+    Template cache in front of LLMClient.parse_intents, used by LLMIntentProcessor.
+    "turn lamp on for 20 seconds then off" and "... 30 seconds ..." share one entry.
+
+    semantic: optional semantic_cache.SemanticIntentCache, tried when the exact
+    key misses, so paraphrases ("make the lamp blue" after "turn the lamp
+    blue") reuse a template too. Semantic hits are copied into the exact tier.
+    """
+    def __init__(self, cache=None, semantic=None):
+        self.cache = cache if cache is not None else TemplateCache()
+        self.semantic = semantic
+        if semantic is not None:
+            # Templates warm-loaded from disk are paraphrase targets too
+            for key, template in self.cache.items():
+                semantic.store(key, template)
+
+    def lookup(self, text):
+        """Returns (intents_json or None, entry) - pass entry back to store()."""
+        key, slots = extract_slots(text)
+        template = self.cache.get(key)
+        if template is None and self.semantic is not None:
+            template, _ = self.semantic.lookup(key)
+            if template is not None:
+                self.cache.put(key, template)
+        if template is not None:
+            return fill_intents(template, slots), (key, slots)
+        return None, (key, slots)
+
+    def store(self, entry, intents_json):
+        key, slots = entry
+        template = template_intents(intents_json, slots)
+        if template is None:
+            return False
+        self.cache.put(key, template)
+        if self.semantic is not None:
+            self.semantic.store(key, template)
+        return True
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        if self.semantic is not None:
+            stats["semantic"] = self.semantic.stats()
+        return stats
+
 # -------------------------------
 # Example usage
 # -------------------------------
@@ -241,3 +655,5 @@ if __name__ == "__main__":
         print(cmd)
         print(seq)
         print("-"*40)
+
+    print("Cache stats:", TEMPLATE_CACHE.stats())
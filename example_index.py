@@ -0,0 +1,138 @@
+# example_index.py
+import math
+import re
+from collections import Counter
+
+from SYSTEM_PROMPT import SYSTEM_PROMPT
+from cache_llm import extract_slots
+
+EXAMPLE_PATTERN = re.compile(r"^User: (.+?)\nJSON: (.+?)(?=\n\s*\nUser: |\n*\Z)", re.S | re.M)
+
+# Examples beyond the ones written into SYSTEM_PROMPT
+EXTRA_EXAMPLES = [
+    ("Bark", '{"intents":[{"type":"hat","action":"bark"}]}'),
+    ("Sit and howl for 5 seconds",
+     '{"intents":[{"type":"hat","action":"sit"},{"type":"hat","action":"howl"},{"type":"hat","action":"sleep","delay":5}]}'),
+    ("Wag your tail and say hello",
+     '{"intents":[{"type":"hat","action":"wag_tail"},{"type":"hat","action":"say","text":"hello"}]}'),
+    ("Lie down then scratch your head",
+     '{"intents":[{"type":"hat","action":"lie"},{"type":"hat","action":"scratch_head"}]}'),
+    ("Set neo lights to purple at 50 brightness",
+     '{"intents":[{"type":"hat","action":"set_neo","colour":"purple","brightness":50}]}'),
+    ("Turn on the living room light and dim it to 50%",
+     '{"intents":[{"type":"zigbee","device":"light","room":"living room","action":"on"},'
+     '{"type":"zigbee","device":"light","room":"living room","action":"dim","dim":50}]}'),
+    ("Turn lamp blue",
+     '{"intents":[{"type":"zigbee","device":"lamp","room":"living room","action":"colour","colour":"blue"}]}'),
+    ("Wait 2 minutes then turn off the heat",
+     '{"intents":[{"type":"zigbee","device":"heat","room":"living room","action":"off","delay":120}]}'),
+    ("Turn off the bedroom lamp",
+     '{"intents":[{"type":"zigbee","device":"lamp","room":"bedroom","action":"off"}]}'),
+    ("What time is it?", '{"intents":[{"type":"chat","text":"What time is it?"}]}'),
+    ("Spin around and tell me a joke",
+     '{"intents":[{"type":"hat","action":"spin"},{"type":"chat","text":"Tell me a joke"}]}'),
+]
+
+
+def parse_examples(prompt: str):
+    """(user, json) pairs from "User: ...\\nJSON: ..." blocks, duplicates removed."""
+    seen = set()
+    examples = []
+    for user, output in EXAMPLE_PATTERN.findall(prompt):
+        user, output = user.strip(), output.strip()
+        if user not in seen:
+            seen.add(user)
+            examples.append((user, output))
+    return examples
+
+
+def default_examples():
+    examples = parse_examples(SYSTEM_PROMPT)
+    known = {user for user, _ in examples}
+    return examples + [example for example in EXTRA_EXAMPLES if example[0] not in known]
+
+
+def terms(text: str):
+    # Template text, so numbers / colours / say text don't dominate similarity; bigrams keep some order
+    template, _ = extract_slots(text)
+    words = template.replace(".", " ").split()
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class ExampleIndex:
+    """
+    BM25 index over a few-shot example bank, built once.
+
+    render(text) returns the top-k examples most similar to the utterance,
+    formatted like the prompt's own examples, so the prompt is the fixed
+    rules plus k examples however large the bank grows. Scoring only visits
+    examples sharing a term with the utterance.
+    """
+    def __init__(self, examples=None, k=3, k1=1.2, b=0.75):
+        self.examples = list(examples if examples is not None else default_examples())
+        self.k = k
+        self.k1 = k1
+        self.b = b
+        self._postings = {}     # term -> [(example index, term frequency)]
+        self._lengths = []
+        self._templates = []
+        for i, (user, _) in enumerate(self.examples):
+            self._templates.append(extract_slots(user)[0])
+            counts = Counter(terms(user))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings.setdefault(term, []).append((i, tf))
+        n = len(self.examples)
+        self._avg_length = sum(self._lengths) / n if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self._postings.items()
+        }
+
+    def __len__(self):
+        return len(self.examples)
+
+    def top_k(self, text: str, k=None):
+        k = self.k if k is None else k
+        scores = {}
+        for term in set(terms(text)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / self._avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        # Examples of the same shape teach the model nothing new; keep one per template.
+        # Always show k examples, padding with the bank's first (most basic) ones
+        ranked = sorted(scores, key=lambda i: (-scores[i], i))
+        ranked += [i for i in range(len(self.examples)) if i not in scores]
+        best, seen = [], set()
+        for i in ranked:
+            if self._templates[i] not in seen:
+                seen.add(self._templates[i])
+                best.append(i)
+                if len(best) == k:
+                    break
+        return [self.examples[i] for i in best]
+
+    def render(self, text: str, k=None) -> str:
+        shots = "\n\n".join(f"User: {user}\nJSON: {output}" for user, output in self.top_k(text, k))
+        return f"\nEXAMPLES:\n\n{shots}" if shots else ""
+
+    def fingerprint(self) -> str:
+        """Text identifying the bank, for cache namespaces."""
+        return f"k={self.k}\n" + "\n".join(f"{user}\t{output}" for user, output in self.examples)
+
+
+if __name__ == "__main__":
+    from prompt_registry import estimate_tokens
+    from SYSTEM_PROMPT import PROMPT_RULES
+
+    index = ExampleIndex()
+    print(f"{len(index)} examples, rules ~{estimate_tokens(PROMPT_RULES)} tokens")
+    for text in ["Turn lamp on for 30 seconds then turn off",
+                 "bark and sleep for 3 seconds",
+                 "shake your paw and tell me the capital of France"]:
+        shots = index.render(text)
+        print(f"\n{text}  (~{estimate_tokens(PROMPT_RULES + shots)} prompt tokens)")
+        print(shots)
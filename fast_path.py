@@ -0,0 +1,127 @@
+# fast_path.py
+import re
+
+from cache_llm import CANONICAL_ACTIONS, COLOURS, normalise, extract_say_text
+from normalisation_rules import SYNONYMS
+
+# -------------------------------
+# Vocabulary
+# -------------------------------
+# "led" is the neo light (handled by NEO_PATTERN), "say" carries free text
+HAT_ACTIONS = [act for act in CANONICAL_ACTIONS if act not in ("led", "say")]
+SLEEP_WORDS = ("sleep", "wait", "pause")
+FILLER_WORDS = {"please", "the", "your", "now", "just", "to"}
+UNIT_SECONDS = {
+    "second": 1, "seconds": 1, "sec": 1, "secs": 1,
+    "minute": 60, "minutes": 60, "min": 60, "mins": 60,
+    "hour": 3600, "hours": 3600,
+}
+
+_units = "|".join(sorted(UNIT_SECONDS, key=len, reverse=True))
+_duration = rf"(?:for )?(?P<n>\d+) (?P<unit>{_units})"
+
+ACTION_PATTERN = re.compile(
+    rf"(?P<action>{'|'.join(map(re.escape, HAT_ACTIONS))})(?: {_duration})?"
+)
+SLEEP_PATTERN = re.compile(rf"(?:{'|'.join(SLEEP_WORDS)}) {_duration}")
+NEO_PATTERN = re.compile(
+    rf"(?:(?:turn|set|make|change) )?(?:{'|'.join(map(re.escape, SYNONYMS['neo']))})"
+    rf"(?: (?:led|leds|lights|pixels))?(?: color)? (?P<colour>{'|'.join(sorted(COLOURS))})(?: {_duration})?"
+)
+CLAUSE_SPLIT = re.compile(r"\s*(?:[.!?]|\band then\b|\bthen\b|\band\b)\s*")
+
+
+def _delay(match):
+    return int(match.group("n")) * UNIT_SECONDS[match.group("unit")]
+
+
+def _sleep(match):
+    # "<action> for N seconds" is a post-action sleep of the same (hat) type
+    return [{"type": "hat", "action": "sleep", "delay": _delay(match)}] if match.group("n") else []
+
+
+class RuleBasedClassifier:
+    """
+    Deterministic pre-classifier for simple HAT commands ("bark", "shake your paw",
+    "turn neo lights red", "sleep for 10 seconds", "... and say hello").
+
+    classify(text) returns (intents_json or None, confidence). confidence is
+    the fraction of words explained by the rules; only utterances at or above
+    min_confidence are answered, everything else returns None and should be
+    sent to the LLM. Output follows the SYSTEM_PROMPT {"intents": [...]} schema.
+    """
+    def __init__(self, min_confidence=1.0):
+        self.min_confidence = min_confidence
+        self.handled = 0
+        self.forwarded = 0
+
+    def _clause(self, clause, say_text):
+        if clause == "say <TEXT>":
+            return [{"type": "hat", "action": "say", "text": say_text}] if say_text else None
+        match = SLEEP_PATTERN.fullmatch(clause)
+        if match:
+            return [{"type": "hat", "action": "sleep", "delay": _delay(match)}]
+        match = NEO_PATTERN.fullmatch(clause)
+        if match:
+            return [{"type": "hat", "action": "set_neo", "colour": match.group("colour")}] + _sleep(match)
+        match = ACTION_PATTERN.fullmatch(clause)
+        if match:
+            return [{"type": "hat", "action": match.group("action")}] + _sleep(match)
+        return None
+
+    def match(self, text: str):
+        """Returns (intents or None, confidence) without touching the counters."""
+        norm_text, say_text = extract_say_text(text, normalise(text))
+
+        intents = []
+        matched_words = total_words = 0
+        for clause in CLAUSE_SPLIT.split(norm_text):
+            words = [w for w in clause.split() if w not in FILLER_WORDS]
+            if not words:
+                continue
+            total_words += len(words)
+            clause_intents = self._clause(" ".join(words), say_text)
+            if clause_intents is None:
+                intents = None
+                continue
+            matched_words += len(words)
+            if intents is not None:
+                intents.extend(clause_intents)
+
+        confidence = round(matched_words / total_words, 3) if total_words else 0.0
+        return intents or None, confidence
+
+    def classify(self, text: str):
+        intents, confidence = self.match(text)
+        if intents is None or confidence < self.min_confidence:
+            self.forwarded += 1
+            return None, confidence
+        self.handled += 1
+        return {"intents": intents}, confidence
+
+    def stats(self) -> dict:
+        total = self.handled + self.forwarded
+        return {
+            "handled": self.handled,
+            "forwarded": self.forwarded,
+            "handled_rate": round(self.handled / total, 3) if total else 0.0,
+        }
+
+
+# -------------------------------
+# Example usage
+# -------------------------------
+if __name__ == "__main__":
+    classifier = RuleBasedClassifier()
+    for cmd in [
+        "Shake your paw",
+        "bark",
+        "Turn NEO lights red",
+        "Sleep for 10 seconds and then bark",
+        "Sit and howl for 5 seconds",
+        "Shake your paw and say doing as you wish, mistress!",
+        "Turn Lamp on for 20 seconds then turn off",
+        "Shake your paw and tell me what Ohm's law is",
+    ]:
+        print(cmd, "->", *classifier.classify(cmd))
+    print("Fast path stats:", classifier.stats())
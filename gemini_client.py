@@ -1,47 +1,100 @@
 import json
-import requests
-from llm_client import LLMClient
+from llm_client import LLMClient, AsyncLLMClient
 from google import genai
+from google.genai import types
 
 
 class GeminiClient(LLMClient):
-    def __init__(self, system_prompt, model="gemini-2.5-flash", api_key="???"):
+    """
+    One genai client (and its connection pool) is kept for the lifetime of
+    the object. The system prompt is sent as a system instruction instead of
+    being pasted into every message; with cache_ttl it is uploaded once as
+    cached content and referenced by name. Each utterance is a stateless
+    generate_content call - a reused chat would carry earlier utterances
+    into the next classification.
 
-        print(model, api_key)
+    genai_client can be injected, e.g. mock_client.StandInGenaiClient to run offline.
+    """
+    def __init__(self, system_prompt, model="gemini-2.5-flash", api_key="???", cache_ttl=None, genai_client=None):
         self.model = model
         self.api_key = api_key
         self.system_prompt = system_prompt
+        self.genai_client = genai_client if genai_client is not None else genai.Client(api_key=self.api_key)
+        self.config = self.build_config(cache_ttl)
+
+    def build_config(self, cache_ttl=None) -> types.GenerateContentConfig:
+        if cache_ttl:
+            try:
+                cache = self.genai_client.caches.create(
+                    model=self.model,
+                    config=types.CreateCachedContentConfig(system_instruction=self.system_prompt,
+                                                           ttl=f"{int(cache_ttl)}s"),
+                )
+                return types.GenerateContentConfig(cached_content=cache.name, temperature=0)
+            except Exception as e:
+                # e.g. prompt below the model's minimum cacheable size
+                print(f"WARNING: could not cache system prompt, sending it as system instruction: {e}")
+        return types.GenerateContentConfig(system_instruction=self.system_prompt, temperature=0)
 
     def parse_intents(self, user_text: str) -> dict:
 
-        genai_client = genai.Client(api_key=self.api_key)
-        chat = genai_client.chats.create(model=self.model)
+        response = self.genai_client.models.generate_content(model=self.model, contents=user_text, config=self.config)
+
+        return parse_gemini_response(response)
+
+
+class AsyncGeminiClient(GeminiClient, AsyncLLMClient):
+    """
+    Non-blocking GeminiClient sharing the same genai client and config.
+    """
+    async def parse_intents(self, user_text: str) -> dict:
+        response = await self.genai_client.aio.models.generate_content(
+            model=self.model, contents=user_text, config=self.config
+        )
 
-        response = chat.send_message(self.system_prompt + "\n" + user_text)
+        return parse_gemini_response(response)
 
-        raw = response.candidates[0].content.parts[0].text
+    async def aclose(self):
+        aclose = getattr(self.genai_client.aio, "aclose", None)
+        if aclose is not None:
+            await aclose()
 
-        # Remove code fences
-        clean = raw.strip()
-        clean = clean.removeprefix("```json")
-        clean = clean.removesuffix("```")
-        clean = clean.strip()
 
-        data = json.loads(clean)
+def parse_gemini_response(response) -> dict:
+    raw = response.candidates[0].content.parts[0].text
 
-        return data #safe_json_load(clean_text)
+    # Remove code fences
+    clean = raw.strip()
+    clean = clean.removeprefix("```json")
+    clean = clean.removesuffix("```")
+    clean = clean.strip()
+
+    data = json.loads(clean)
+
+    return data #safe_json_load(clean_text)
 
 
 if __name__ == "__main__":
     import os
+    import sys
     from BANANA_PROMPT import SYSTEM_PROMPT
 
-    # Configure API key
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("Set your GOOGLE_API_KEY environment variable first!")
+    if "--offline" in sys.argv:
+        # Local stand-in: no API key or network needed
+        from mock_client import StandInGenaiClient
+        stand_in = StandInGenaiClient()
+        client = GeminiClient(SYSTEM_PROMPT, api_key="offline", cache_ttl=3600, genai_client=stand_in)
+    else:
+        # Configure API key
+        api_key = os.environ.get("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("Set your GOOGLE_API_KEY environment variable first!")
+
+        client = GeminiClient(SYSTEM_PROMPT, api_key = api_key)
 
-    client = GeminiClient(SYSTEM_PROMPT, api_key = api_key)
+    for _ in range(2):
+        response = client.parse_intents("I like toy ducks, bananas, oranges and the sun. On Wednesdays I eat sweetcorn.")
+        print("RESPONSE ", response)
 
-    response = client.parse_intents("I like toy ducks, bananas, oranges and the sun. On Wednesdays I eat sweetcorn.")
-    print("RESPONSE ", response)
\ No newline at end of file
+    if "--offline" in sys.argv:
+        print("Stand-in calls:", stand_in.calls)
@@ -1,11 +1,17 @@
 import json
+import httpx
 import requests
+from llm_client import LLMClient, AsyncLLMClient
+from ollama_client import generate_timings
+from json_repair import repair_json
+from metrics import NULL_METRICS
 
 # -----------------------------
 # Configuration
 # -----------------------------
 
-OLLAMA_URL = "http://aiplus2:8000/api/chat"
+OLLAMA_HOST = "http://aiplus2:8000"
+OLLAMA_URL = f"{OLLAMA_HOST}/api/chat"
 #DEFAULT_LLM_MODEL = "llama3.2:3b"  # change if needed
 DEFAULT_LLM_MODEL = "qwen2:1.5b"
 
@@ -69,16 +75,18 @@ Output:
 
 def safe_json_load(text: str) -> dict:
     """
-    Attempts to parse JSON from LLM output.
-    Raises ValueError if parsing fails.
+    Attempts to parse JSON from LLM output, repairing near-valid JSON.
+    Raises ValueError if nothing usable can be recovered.
     """
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"LLM did not return valid JSON:\n{text}") from e
+    data, repairs = repair_json(text)
+    if "error" in data:
+        raise ValueError(f"LLM did not return valid JSON ({', '.join(repairs)}):\n{text}")
+    if repairs:
+        print(f"WARNING: repaired LLM JSON {repairs}: {text!r}")
+    return data
 
 
-def call_llm_http(text: str, send_system_prompt: bool = True) -> dict:
+def call_llm_http(text: str, send_system_prompt: bool = True, keep_alive: str = "30m") -> dict:
 
     messages = [{"role": "user", "content": text}]
     if send_system_prompt:
@@ -93,6 +101,8 @@ def call_llm_http(text: str, send_system_prompt: bool = True) -> dict:
         },
         "format": "json",
         "stream": False,
+        # Keep the model and its evaluated system prompt prefix resident between calls
+        "keep_alive": keep_alive,
     }
 
     response = requests.post(
@@ -104,9 +114,103 @@ def call_llm_http(text: str, send_system_prompt: bool = True) -> dict:
     #print(response, response.content)
 
     data = response.json()
+    print("LLM timings:", generate_timings(data))
     return safe_json_load(data["message"]["content"])
 
 
+# -----------------------------
+# LLMClient wrappers
+# -----------------------------
+
+class HailoClient(LLMClient):
+    """
+    LLMClient for the Hailo ollama endpoint (/api/chat with format json).
+    The system message is a byte-identical prefix on every request and
+    keep_alive keeps it resident, so the server can reuse its evaluated state.
+    Per-call timings are kept in last_timings and passed to on_timings, the
+    JSON repairs applied to the last response in last_repairs.
+    schema replaces format "json" with a JSON schema (intent_schema.INTENTS_SCHEMA).
+    """
+    def __init__(self, prompt, model=DEFAULT_LLM_MODEL, host=OLLAMA_HOST, keep_alive="30m", on_timings=None,
+                 metrics=None, schema=None):
+        self.model = model
+        self.host = host.rstrip("/")
+        self.url = f"{self.host}/api/chat"
+        self.prompt = prompt
+        self.keep_alive = keep_alive
+        self.on_timings = on_timings
+        self.last_timings = {}
+        self.last_repairs = []
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.schema = schema
+
+    def build_payload(self, user_text: str) -> dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.prompt},
+                {"role": "user", "content": user_text},
+            ],
+            "options": {
+                "temperature": 0,
+                "num_predict": 300,
+            },
+            "format": self.schema if self.schema is not None else "json",
+            "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+
+    def parse_response(self, data: dict) -> dict:
+        self.last_timings = generate_timings(data)
+        if self.on_timings:
+            self.on_timings(self.model, self.last_timings)
+        content = data["message"]["content"]
+        intents_json, self.last_repairs = repair_json(content)
+        if self.last_repairs:
+            print(f"WARNING: repaired LLM JSON {self.last_repairs}: {content!r}")
+        for repair in self.last_repairs:
+            self.metrics.inc("json_repairs", model=self.model, repair=repair)
+        return intents_json
+
+    def parse_intents(self, user_text: str) -> dict:
+        with self.metrics.timer("http", model=self.model):
+            response = requests.post(self.url, json=self.build_payload(user_text), timeout=360)
+            response.raise_for_status()
+        with self.metrics.timer("parse", model=self.model):
+            return self.parse_response(response.json())
+
+
+class AsyncHailoClient(HailoClient, AsyncLLMClient):
+    """
+    Non-blocking HailoClient sharing one pooled keep-alive HTTP session.
+    """
+    def __init__(self, prompt, model=DEFAULT_LLM_MODEL, host=OLLAMA_HOST,
+                 timeout=360, max_connections=4, **kwargs):
+        super().__init__(prompt, model=model, host=host, **kwargs)
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.session = None
+
+    def _get_session(self) -> httpx.AsyncClient:
+        if self.session is None:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self.session = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+        return self.session
+
+    async def parse_intents(self, user_text: str) -> dict:
+        with self.metrics.timer("http", model=self.model):
+            response = await self._get_session().post(self.url, json=self.build_payload(user_text))
+            response.raise_for_status()
+        with self.metrics.timer("parse", model=self.model):
+            return self.parse_response(response.json())
+
+    async def aclose(self):
+        if self.session is not None:
+            await self.session.aclose()
+            self.session = None
+
+
 # -----------------------------
 # Main
 # -----------------------------
@@ -0,0 +1,106 @@
+# intent_publisher.py
+import asyncio
+import json
+
+from metrics import NULL_METRICS
+
+DEFAULT_TOPICS = {
+    "hat": "intent/hat",
+    "zigbee": "intent/zigbee",
+    "chat": "intent/chat"
+}
+
+
+def dumps_compact(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"))
+
+
+class IntentPublisher:
+    """
+    Publishes intents to the MQTT topic for their type.
+
+    Each payload is serialised once, compactly. Every publish is handed to
+    the MQTT client in submission order, across utterances too, without
+    waiting for the broker's ack of the one before: the client sends them
+    in that order over its one connection and the acks are awaited
+    together. publish() only queues the send, so the caller is not held up
+    by broker round trips.
+
+    pack=True sends all intents of one utterance for a topic as a single
+    {"intents": [...]} message (publish_intents only - streamed intents
+    arrive one at a time). `client` is an aiomqtt.Client, set once connected.
+    """
+    def __init__(self, client=None, topics=None, qos=1, pack=False, metrics=None):
+        self.client = client
+        self.topics = topics if topics is not None else DEFAULT_TOPICS
+        self.qos = qos
+        self.pack = pack
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self._pending = set()   # publish tasks not yet acked
+        self.published = 0
+        self.failed = 0
+        self.unrouted = 0
+
+    def topic_for(self, intent: dict):
+        topic = self.topics.get(str(intent.get("type", "")).lower())
+        if topic is None:
+            self.unrouted += 1
+        return topic
+
+    def publish(self, intent: dict):
+        """Queue one intent. Returns the publish task, or None if its type has no topic."""
+        topic = self.topic_for(intent)
+        if topic is None:
+            return None
+        return self._enqueue(topic, dumps_compact(intent))
+
+    async def publish_intents(self, intents_json: dict):
+        """Publish every intent of one utterance and wait until the broker has them."""
+        by_topic = {}
+        for intent in intents_json.get("intents", []):
+            topic = self.topic_for(intent)
+            if topic is not None:
+                by_topic.setdefault(topic, []).append(intent)
+
+        if self.pack:
+            tasks = [self._enqueue(topic, dumps_compact({"intents": intents})) for topic, intents in by_topic.items()]
+        else:
+            tasks = [self._enqueue(topic, dumps_compact(intent))
+                     for topic, intents in by_topic.items() for intent in intents]
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def flush(self):
+        """Wait for every queued publish."""
+        while self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._pending),
+            "published": self.published,
+            "failed": self.failed,
+            "unrouted": self.unrouted,
+        }
+
+    def _enqueue(self, topic: str, payload: str):
+        # Tasks take their first step in creation order, and client.publish()
+        # queues the message on the connection in its first step - only the
+        # wait for the ack is concurrent
+        task = asyncio.ensure_future(self._send(topic, payload))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def _send(self, topic: str, payload: str):
+        try:
+            if self.client is None:
+                raise ConnectionError("MQTT client not connected")
+            with self.metrics.timer("publish", topic=topic):
+                await self.client.publish(topic, payload, qos=self.qos)
+        except Exception as e:
+            print(f"Publish to {topic} failed: {e}")
+            self.failed += 1
+            return
+        self.published += 1
+        print(f"Published to {topic}: {payload}")
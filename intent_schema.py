@@ -0,0 +1,243 @@
+# intent_schema.py
+import re
+
+from SYSTEM_PROMPT import SYSTEM_PROMPT
+
+FIELDS_SECTION = re.compile(r"^Fields:\s*\n((?:- .+\n?)+)", re.M)
+PARENTHETICAL = re.compile(r"\s*\([^)]*\)")
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+DURATION = re.compile(r"(-?\d+(?:\.\d+)?)\s*(?:(h|hours?|hrs?)|(m|minutes?|mins?)|(s|seconds?|secs?))?\b")
+
+# Fields sent as numbers; everything else is a string
+INTEGER_FIELDS = {"delay", "dim", "brightness"}
+
+# Repairs that keep the LLM's meaning; any other repair drops or rebuilds
+# intents, so the result is used once but never cached
+LOSSLESS_REPAIRS = ("coerced:", "type_case")
+
+# An intent missing any of these is useless downstream and is dropped
+REQUIRED_FIELDS = {
+    "hat": ("action",),
+    "zigbee": ("device", "action"),
+    "chat": ("text",),
+}
+
+
+def parse_prompt_fields(prompt: str = SYSTEM_PROMPT) -> dict:
+    """
+    Intent type -> allowed fields, from the prompt's "Fields:" list, e.g.
+    "- hat: action, text (for say), delay (for sleep)" -> {"hat": ["action", "text", "delay"]}.
+    """
+    match = FIELDS_SECTION.search(prompt)
+    if not match:
+        raise ValueError("prompt has no 'Fields:' section")
+    fields = {}
+    for line in match.group(1).splitlines():
+        intent_type, _, names = line[2:].partition(":")
+        names = PARENTHETICAL.sub("", names)
+        fields[intent_type.strip()] = [name.strip() for name in names.split(",") if name.strip()]
+    return fields
+
+
+def build_intents_schema(fields: dict) -> dict:
+    """
+    JSON schema for {"intents": [...]}, for Ollama's `format`. One flat item
+    schema (type enum + the union of every type's fields) keeps the
+    generated grammar small; per-type fields are enforced by IntentValidator.
+    """
+    properties = {"type": {"type": "string", "enum": list(fields)}}
+    for names in fields.values():
+        for name in names:
+            properties[name] = {"type": "integer" if name in INTEGER_FIELDS else "string"}
+    return {
+        "type": "object",
+        "properties": {
+            "intents": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": ["type"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["intents"],
+    }
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value))
+    if isinstance(value, str):
+        # "20", "20 seconds", "40%"
+        match = NUMBER.search(value)
+        return int(round(float(match.group()))) if match else None
+    return None
+
+
+def _to_seconds(value):
+    # delay: "2 minutes" -> 120, "1 hour" -> 3600, as the prompt's conversion rules
+    if not isinstance(value, str):
+        return _to_int(value)
+    match = DURATION.search(value)
+    if not match:
+        return None
+    hours, minutes, _ = match.groups()[1:]
+    factor = 3600 if hours else 60 if minutes else 1
+    return int(round(float(match.group(1)) * factor))
+
+
+def is_lossy(repairs) -> bool:
+    """True if any repair dropped or rebuilt intents / fields."""
+    return any(not repair.startswith(LOSSLESS_REPAIRS) for repair in repairs)
+
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+def _coercer(name):
+    if name == "delay":
+        return _to_seconds
+    return _to_int if name in INTEGER_FIELDS else _to_str
+
+
+class IntentValidator:
+    """
+    Checks LLM output against the intent fields and repairs it locally.
+
+    The per-type field -> coercer tables are compiled once. validate()
+    wraps a bare intent or list in {"intents": [...]}, lowercases types,
+    coerces numbers ("20 seconds" -> 20, delay "2 minutes" -> 120), drops
+    fields that do not belong to the intent's type (no hat/zigbee mixing)
+    and drops intents with an
+    unknown type or missing required fields. Parse errors ({"error": ...})
+    pass through unchanged. The repairs applied to the last result are kept
+    in last_repairs; last_lossy is True when intents or fields were dropped
+    or the structure had to be rebuilt - such a result must not be cached.
+    """
+    def __init__(self, fields=None, required=None):
+        fields = fields if fields is not None else parse_prompt_fields()
+        required = required if required is not None else REQUIRED_FIELDS
+        self._coercers = {
+            intent_type: {name: _coercer(name) for name in names}
+            for intent_type, names in fields.items()
+        }
+        self._required = {intent_type: required.get(intent_type, ()) for intent_type in fields}
+        self.schema = build_intents_schema(fields)
+        self.last_repairs = []
+        self.last_lossy = False
+        self.checked = 0
+        self.repaired = 0
+        self.dropped_fields = 0
+        self.dropped_intents = 0
+
+    def validate(self, data) -> dict:
+        self.checked += 1
+        repairs = []
+        if isinstance(data, dict) and "error" in data:
+            self.last_repairs = repairs
+            self.last_lossy = True
+            return data
+
+        if isinstance(data, list):
+            repairs.append("wrapped_list")
+            items = data
+        elif isinstance(data, dict) and "intents" not in data and "type" in data:
+            repairs.append("wrapped_intent")
+            items = [data]
+        elif isinstance(data, dict) and isinstance(data.get("intents"), list):
+            items = data["intents"]
+        else:
+            repairs.append("no_intents")
+            items = []
+
+        intents = []
+        for item in items:
+            intent = self.validate_intent(item, repairs)
+            if intent is not None:
+                intents.append(intent)
+
+        if repairs:
+            self.repaired += 1
+        self.last_repairs = repairs
+        self.last_lossy = is_lossy(repairs)
+        return {"intents": intents}
+
+    def validate_intent(self, item, repairs=None):
+        """One repaired intent, or None if it cannot be used."""
+        repairs = repairs if repairs is not None else []
+        if not isinstance(item, dict):
+            self.dropped_intents += 1
+            repairs.append("dropped_non_object")
+            return None
+
+        intent_type = item.get("type")
+        coercers = self._coercers.get(intent_type)
+        if coercers is None and isinstance(intent_type, str):
+            intent_type = intent_type.strip().lower()
+            coercers = self._coercers.get(intent_type)
+            if coercers is not None:
+                repairs.append("type_case")
+        if coercers is None:
+            self.dropped_intents += 1
+            repairs.append(f"dropped_type:{intent_type}")
+            return None
+
+        intent = {"type": intent_type}
+        for name, value in item.items():
+            if name == "type":
+                continue
+            coerce = coercers.get(name)
+            fixed = coerce(value) if coerce else None
+            if fixed is None:
+                self.dropped_fields += 1
+                repairs.append(f"dropped_field:{intent_type}.{name}")
+                continue
+            if fixed != value:
+                repairs.append(f"coerced:{intent_type}.{name}")
+            intent[name] = fixed
+
+        for name in self._required[intent_type]:
+            if name not in intent:
+                self.dropped_intents += 1
+                repairs.append(f"missing:{intent_type}.{name}")
+                return None
+        return intent
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "repaired": self.repaired,
+            "dropped_fields": self.dropped_fields,
+            "dropped_intents": self.dropped_intents,
+        }
+
+
+INTENTS_SCHEMA = build_intents_schema(parse_prompt_fields())
+
+
+if __name__ == "__main__":
+    import json
+
+    validator = IntentValidator()
+    print(json.dumps(INTENTS_SCHEMA["properties"]["intents"]["items"]["properties"]))
+    samples = [
+        {"intents": [{"type": "hat", "action": "sleep", "delay": "10 seconds"}]},
+        {"intents": [{"type": "hat", "action": "sleep", "delay": "2 minutes"}]},
+        {"actions": [{"type": "hat", "action": "bark"}]},
+        {"intents": [{"type": "Zigbee", "device": "lamp", "room": "living room", "action": "dim", "dim": "40%",
+                      "text": "x"}, {"type": "hat"}, "bark"]},
+        [{"type": "chat", "text": "What is Ohm's law?"}],
+        {"error": "invalid_json"},
+    ]
+    for sample in samples:
+        print(validator.validate(sample), validator.last_repairs, "lossy" if validator.last_lossy else "")
+    print(validator.stats())
@@ -0,0 +1,124 @@
+# intent_stream.py
+import json
+
+from json_repair import repair_json
+
+
+class IncrementalIntentParser:
+    """
+    Incremental parser for a streamed {"intents": [ ... ]} response.
+
+    feed() takes raw text chunks as they arrive from the LLM and returns every
+    intent object whose closing brace has been seen, so callers can act on
+    the first intent while the rest is still being generated. Code fences
+    and text around the JSON are ignored.
+
+    finished is set once the array's closing bracket arrives; skipped counts
+    intent objects that could not be parsed. If the stream ends unfinished
+    (no literal "intents" array, single quotes, truncation), recover() runs
+    repair_json over the whole text for the intents feed() did not return.
+    """
+    def __init__(self):
+        self.text = ""
+        self.buffer = ""
+        self.pos = 0
+        self.in_array = False
+        self.finished = False
+        self.depth = 0
+        self.obj_start = None
+        self.in_string = False
+        self.escaped = False
+        self.intents = []
+        self.skipped = 0
+
+    def feed(self, chunk: str) -> list:
+        if self.finished or not chunk:
+            return []
+        self.text += chunk
+        self.buffer += chunk
+        completed = []
+
+        if not self.in_array and not self._seek_array():
+            return completed
+
+        buf = self.buffer
+        i = self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.obj_start = i
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    intent = self._load(buf[self.obj_start:i + 1])
+                    if intent is not None:
+                        completed.append(intent)
+                    self.obj_start = None
+            elif ch == "]" and self.depth == 0:
+                self.finished = True
+                break
+            i += 1
+
+        # Keep only the unfinished object (if any) in the buffer
+        keep_from = self.obj_start if self.obj_start is not None else i
+        self.buffer = buf[keep_from:]
+        self.pos = i - keep_from
+        if self.obj_start is not None:
+            self.obj_start = 0
+
+        self.intents.extend(completed)
+        return completed
+
+    def result(self) -> dict:
+        return {"intents": list(self.intents)}
+
+    def recover(self) -> list:
+        """Intents repair_json finds in the whole response beyond those feed() already returned."""
+        data, repairs = repair_json(self.text)
+        if isinstance(data, dict) and isinstance(data.get("intents"), list):
+            items = data["intents"]
+        elif isinstance(data, list):
+            items = data
+        elif isinstance(data, dict) and "type" in data:
+            items = [data]
+        else:
+            items = []
+        recovered = [item for item in items[len(self.intents):] if isinstance(item, dict)]
+        print(f"WARNING: incomplete streamed reply, recovered {len(recovered)} intent(s) {repairs}: {self.text!r}")
+        return recovered
+
+    def _seek_array(self) -> bool:
+        key = self.buffer.find('"intents"')
+        if key < 0:
+            return False
+        bracket = self.buffer.find("[", key)
+        if bracket < 0:
+            return False
+        self.in_array = True
+        self.buffer = self.buffer[bracket + 1:]
+        self.pos = 0
+        return True
+
+    def _load(self, text):
+        try:
+            intent = json.loads(text)
+        except json.JSONDecodeError:
+            # Trailing comma, single quotes, ...
+            intent, repairs = repair_json(text)
+            if "error" in intent:
+                print("WARNING: skipping invalid streamed intent:", repr(text))
+                self.skipped += 1
+                return None
+            print(f"WARNING: repaired streamed intent {repairs}: {text!r}")
+        return intent if isinstance(intent, dict) else None
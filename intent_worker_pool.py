@@ -0,0 +1,371 @@
+# intent_worker_pool.py
+import asyncio
+import heapq
+import inspect
+from time import monotonic
+
+_END = object()
+_FAILED = object()
+
+# Outcome a submit() future resolves with
+EMITTED = "emitted"                 # result emitted
+NO_OUTPUT = "no_output"             # processed, nothing to emit (e.g. a suppressed duplicate)
+FAILED = "failed"
+DROPPED_STALE = "dropped_stale"
+DROPPED_OVERFLOW = "dropped_overflow"
+COALESCED = "coalesced"             # text merged into an earlier queued message
+
+DEFAULT_PRIORITY = 1
+DEMOTED_PRIORITY = float("inf")
+OVERLOAD_POLICIES = ("block", "drop_oldest", "drop_newest", "coalesce")
+STALE_POLICIES = ("drop", "demote")
+
+
+class _Job:
+    __slots__ = ("source", "payload", "previous", "done", "enqueued_at", "priority", "seq", "alive", "demoted")
+
+    def __init__(self, source, payload, previous, done, priority):
+        self.source = source
+        self.payload = payload
+        self.previous = previous
+        self.done = done
+        self.enqueued_at = monotonic()
+        self.priority = priority
+        self.seq = 0
+        self.alive = True
+        self.demoted = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class IngressQueue:
+    """
+    Bounded priority queue of jobs: lowest priority value first, then
+    arrival order. Jobs can be removed from the middle (evict_oldest) for
+    overload shedding. Mirrors the asyncio.Queue calls the pool needs.
+
+    Its events are created by bind() inside the running loop: the pool is
+    usually built at import time, and before Python 3.10 an Event binds to
+    the loop current when it is created.
+    """
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self._heap = []
+        self._seq = 0
+        self._live = 0
+        self._unfinished = 0
+        self._loop = None
+        self._not_empty = None
+        self._not_full = None
+        self._all_done = None
+
+    def bind(self):
+        """Create the events for the running loop (again after a loop change)."""
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        self._loop = loop
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._all_done = asyncio.Event()
+        if self._live:
+            self._not_empty.set()
+        if not self.full():
+            self._not_full.set()
+        if not self._unfinished:
+            self._all_done.set()
+
+    def qsize(self) -> int:
+        return self._live
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self._live
+
+    def put_nowait(self, job: _Job, new=True):
+        self._seq += 1
+        job.seq = self._seq
+        job.alive = True
+        heapq.heappush(self._heap, job)
+        self._live += 1
+        if new:
+            self._unfinished += 1
+            self._all_done.clear()
+        self._not_empty.set()
+
+    async def wait_not_full(self):
+        while self.full():
+            self._not_full.clear()
+            await self._not_full.wait()
+
+    async def get(self) -> _Job:
+        while True:
+            while self._heap and not self._heap[0].alive:
+                heapq.heappop(self._heap)
+            if self._heap:
+                job = heapq.heappop(self._heap)
+                job.alive = False
+                self._live -= 1
+                self._not_full.set()
+                return job
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+    def remove(self, job: _Job):
+        # Lazy deletion: skipped when it reaches the top of the heap
+        if job.alive:
+            job.alive = False
+            self._live -= 1
+            self._not_full.set()
+
+    def evict_oldest(self):
+        """Oldest job of the least important priority, or None."""
+        live = [job for job in self._heap if job.alive]
+        if not live:
+            return None
+        victim = max(live, key=lambda job: (job.priority, -job.seq))
+        self.remove(victim)
+        return victim
+
+    def newest_from(self, source):
+        live = [job for job in self._heap if job.alive and job.source == source]
+        return max(live, key=lambda job: job.seq) if live else None
+
+    def oldest_age(self, now=None) -> float:
+        now = monotonic() if now is None else now
+        return max((now - job.enqueued_at for job in self._heap if job.alive), default=0.0)
+
+    def task_done(self):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._unfinished = 0
+            self._all_done.set()
+
+    async def join(self):
+        await self._all_done.wait()
+
+
+class OrderedWorkerPool:
+    """
+    Bounded pool of workers for incoming utterances.
+
+    Up to `workers` messages are processed concurrently, but results are
+    emitted in arrival order for each source (MQTT topic). Different sources
+    never wait on each other.
+
+        process_fn(source, payload) -> result     (runs concurrently)
+        emit_fn(source, result)                   (runs in per-source order)
+
+    If process_fn is an async generator, each yielded item is passed to
+    emit_fn as soon as it is produced (once earlier messages from the same
+    source have been emitted), so streamed intents are not held back until
+    the whole message is done.
+
+    Ingress control:
+    - priorities: source -> priority, lower is taken first (default 1), so
+      e.g. keybd/text can preempt queued stt/text messages
+    - max_age: messages waiting longer than this many seconds are stale;
+      stale="drop" sheds them, stale="demote" sends them behind everything
+      else queued (they still keep their place in per-source emit order)
+    - max_queue / overload, when the queue is full:
+        block       - submit() waits for room
+        drop_oldest - shed the oldest message of the least important priority
+        drop_newest - shed the incoming message
+        coalesce    - append the text to the newest queued message from the
+                      same source (drop_oldest if there is none)
+    Shed messages resolve their submit() future without emitting; the
+    future's result is the message's outcome (EMITTED, NO_OUTPUT, FAILED or
+    why it was shed).
+    """
+    def __init__(self, process_fn, emit_fn, workers=4, max_queue=0, priorities=None, overload="block",
+                 max_age=None, stale="drop"):
+        if overload not in OVERLOAD_POLICIES:
+            raise ValueError(f"overload must be one of {OVERLOAD_POLICIES}")
+        if stale not in STALE_POLICIES:
+            raise ValueError(f"stale must be one of {STALE_POLICIES}")
+        self.process_fn = process_fn
+        self.emit_fn = emit_fn
+        self.streaming = inspect.isasyncgenfunction(process_fn)
+        self.workers = workers
+        self.queue = IngressQueue(maxsize=max_queue)
+        self.priorities = priorities or {}
+        self.overload = overload
+        self.max_age = max_age
+        self.stale = stale
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped_stale = 0
+        self.demoted = 0
+        self.dropped_overflow = 0
+        self.coalesced = 0
+        self._tails = {}          # source -> future resolved when its last job has emitted
+        self._tasks = []
+        self._emitters = set()
+
+    def start(self):
+        self.queue.bind()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self):
+        """Wait until every submitted message has been processed and emitted."""
+        self.queue.bind()
+        await self.queue.join()
+        while self._emitters:
+            await asyncio.gather(*list(self._emitters), return_exceptions=True)
+
+    async def submit(self, source: str, payload):
+        """Queue a message. Returns a future resolved with its outcome once it has been emitted (or shed)."""
+        loop = asyncio.get_running_loop()
+        self.queue.bind()
+        if self.queue.full():
+            if self.overload == "block":
+                await self.queue.wait_not_full()
+            elif self.overload == "drop_newest":
+                self.dropped_overflow += 1
+                done = loop.create_future()
+                done.set_result(DROPPED_OVERFLOW)
+                return done
+            else:
+                target = self.queue.newest_from(source) if self.overload == "coalesce" else None
+                if target is not None:
+                    target.payload = f"{target.payload}. {payload}"
+                    self.coalesced += 1
+                    # Resolves with the merged message, but reports this one as coalesced
+                    done = loop.create_future()
+                    target.done.add_done_callback(lambda _: done.done() or done.set_result(COALESCED))
+                    return done
+                victim = self.queue.evict_oldest()
+                if victim is not None:
+                    self.dropped_overflow += 1
+                    self._shed(victim, DROPPED_OVERFLOW)
+
+        previous = self._tails.get(source)
+        done = loop.create_future()
+        self._tails[source] = done
+        self.queue.put_nowait(_Job(source, payload, previous, done, self.priorities.get(source, DEFAULT_PRIORITY)))
+        return done
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "oldest_s": round(self.queue.oldest_age(), 2),
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped_stale": self.dropped_stale,
+            "demoted": self.demoted,
+            "dropped_overflow": self.dropped_overflow,
+            "coalesced": self.coalesced,
+        }
+
+    def _shed(self, job: _Job, outcome):
+        # Resolve only after earlier messages from the source, so successors keep their order
+        self._start_emitter(self._emit_in_order(job.source, None, job.previous, job.done, outcome))
+        self.queue.task_done()
+
+    def _is_stale(self, job: _Job) -> bool:
+        return self.max_age is not None and monotonic() - job.enqueued_at > self.max_age
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            if self._is_stale(job):
+                if self.stale == "drop":
+                    self.dropped_stale += 1
+                    self._shed(job, DROPPED_STALE)
+                    continue
+                if not job.demoted and self.queue.qsize() > 0:
+                    job.demoted = True
+                    job.priority = DEMOTED_PRIORITY
+                    self.demoted += 1
+                    self.queue.put_nowait(job, new=False)
+                    continue
+
+            source, payload, previous, done = job.source, job.payload, job.previous, job.done
+            self.in_flight += 1
+            if self.streaming:
+                await self._run_streaming(source, payload, previous, done)
+                continue
+            outcome = NO_OUTPUT
+            try:
+                result = await self.process_fn(source, payload)
+            except Exception as e:
+                print(f"Worker error on {source}: {e}")
+                self.failed += 1
+                result, outcome = None, FAILED
+            finally:
+                self.in_flight -= 1
+                self.queue.task_done()
+
+            # Emission waits for the previous job of the same source, but runs
+            # as its own task so the worker is free to take the next message.
+            self._start_emitter(self._emit_in_order(source, result, previous, done, outcome))
+
+    async def _run_streaming(self, source, payload, previous, done):
+        channel = asyncio.Queue()
+        self._start_emitter(self._emit_stream(source, channel, previous, done))
+        try:
+            async for item in self.process_fn(source, payload):
+                channel.put_nowait(item)
+        except Exception as e:
+            print(f"Worker error on {source}: {e}")
+            self.failed += 1
+            channel.put_nowait(_FAILED)
+        finally:
+            channel.put_nowait(_END)
+            self.in_flight -= 1
+            self.queue.task_done()
+
+    def _start_emitter(self, coro):
+        emitter = asyncio.create_task(coro)
+        self._emitters.add(emitter)
+        emitter.add_done_callback(self._emitters.discard)
+
+    async def _emit_in_order(self, source, result, previous, done, outcome=NO_OUTPUT):
+        try:
+            if previous is not None:
+                await previous
+            if result is not None:
+                await self.emit_fn(source, result)
+                self.processed += 1
+                outcome = EMITTED
+        except Exception as e:
+            print(f"Emit error on {source}: {e}")
+            self.failed += 1
+            outcome = FAILED
+        finally:
+            self._finish(source, done, outcome)
+
+    async def _emit_stream(self, source, channel, previous, done):
+        outcome = NO_OUTPUT
+        try:
+            if previous is not None:
+                await previous
+            while (item := await channel.get()) is not _END:
+                if item is _FAILED:
+                    outcome = FAILED
+                    continue
+                await self.emit_fn(source, item)
+                if outcome is NO_OUTPUT:
+                    outcome = EMITTED
+            if outcome is not FAILED:
+                self.processed += 1
+        except Exception as e:
+            print(f"Emit error on {source}: {e}")
+            self.failed += 1
+            outcome = FAILED
+        finally:
+            self._finish(source, done, outcome)
+
+    def _finish(self, source, done, outcome):
+        done.set_result(outcome)
+        if self._tails.get(source) is done:
+            del self._tails[source]
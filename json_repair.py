@@ -0,0 +1,189 @@
+# json_repair.py
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CODE_FENCE = re.compile(r"```(?:json)?")
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+CLOSERS = {"{": "}", "[": "]"}
+# Containers closing back to this depth (an intent inside the intents array, or the array
+# itself) mark a safe point to cut truncated output back to - never a half-written intent
+CHECKPOINT_DEPTH = 2
+
+
+def loads(text: str):
+    """json.loads, through orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError as e:
+            raise ValueError(str(e)) from None
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(str(e)) from None
+
+
+def _closes_quote(text: str, i: int) -> bool:
+    # A ' ends a single-quoted string only before , : } ] or the end ("'Ohm's law'" keeps its apostrophe)
+    j = i + 1
+    while j < len(text) and text[j] in " \t\r\n":
+        j += 1
+    return j == len(text) or text[j] in ",:}]"
+
+
+def _rewrite(text: str, repairs: list) -> str:
+    """
+    One pass over the text from its first "{": normalises quotes, literals
+    and commas, stops after the top-level object, and on truncation rolls
+    back to the last completed intent and closes what is still open.
+    """
+    out = []
+    stack = []
+    checkpoint = None           # (len(out), stack copy) after the last safely completed value
+    quote = None                # quote char of the string being copied, if any
+    escaped = False
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if quote is not None:
+            if escaped:
+                escaped = False
+                out.append(ch)
+            elif ch == "\\":
+                escaped = True
+                out.append(ch)
+            elif ch == quote and (quote == '"' or _closes_quote(text, i)):
+                quote = None
+                out.append('"')
+            elif ch == '"':
+                # Double quote inside a single-quoted string
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch == '"' or ch == "'":
+            if ch == "'" and "single_quotes" not in repairs:
+                repairs.append("single_quotes")
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            previous = next((piece for piece in reversed(out) if not piece.isspace()), "")
+            if previous in ("}", "]") and stack and stack[-1] == "[":
+                repairs.append("missing_comma")
+                out.append(",")
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            if not stack:
+                break
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+                if "trailing_comma" not in repairs:
+                    repairs.append("trailing_comma")
+            opener = stack.pop()
+            if CLOSERS[opener] != ch:
+                repairs.append("mismatched_bracket")
+            out.append(CLOSERS[opener])
+            if not stack:
+                if text[i + 1:].strip():
+                    repairs.append("surrounding_text")
+                return "".join(out)
+            if len(stack) <= CHECKPOINT_DEPTH:
+                checkpoint = (len(out), list(stack))
+        elif ch.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            if word in PYTHON_LITERALS:
+                repairs.append("python_literal")
+                word = PYTHON_LITERALS[word]
+            out.append(word)
+            i = j
+            continue
+        elif not ch.isspace() or stack:
+            out.append(ch)
+        i += 1
+
+    # Ran out of text with containers still open (num_predict cut it off)
+    repairs.append("truncated")
+    if checkpoint is None:
+        return None
+    length, stack = checkpoint
+    del out[length:]
+    while out and out[-1] in " \t\r\n,":
+        out.pop()
+    out.extend(CLOSERS[opener] for opener in reversed(stack))
+    return "".join(out)
+
+
+def repair_json(content: str):
+    """
+    Parse near-valid LLM JSON. Returns (data, repairs): data is the parsed
+    object, or {"error": "invalid_json"} if nothing usable was found;
+    repairs lists what had to be fixed, empty for clean output.
+
+    Valid JSON takes the fast path (one decode of the outermost {...}).
+    Otherwise code fences and text around the object, trailing commas,
+    single quotes, Python literals and missing commas between objects are
+    fixed, and truncated output is cut back to its last complete intent,
+    so a response cut off in its 5th intent still yields the first 4.
+    """
+    repairs = []
+    start = content.find("{")
+    if start < 0:
+        return {"error": "invalid_json"}, ["no_object"]
+    end = content.rfind("}") + 1
+    if end > start:
+        try:
+            data = loads(content[start:end])
+        except ValueError:
+            pass
+        else:
+            if content[:start].strip() or content[end:].strip():
+                repairs.append("code_fence" if CODE_FENCE.search(content) else "surrounding_text")
+            return data, repairs
+
+    if CODE_FENCE.search(content):
+        repairs.append("code_fence")
+        content = CODE_FENCE.sub("", content)
+        start = content.find("{")
+    elif content[:start].strip():
+        repairs.append("surrounding_text")
+
+    text = _rewrite(content[start:], repairs)
+    if text is None:
+        return {"error": "invalid_json"}, repairs
+    try:
+        return loads(text), repairs
+    except ValueError:
+        repairs.append("unrepairable")
+        return {"error": "invalid_json"}, repairs
+
+
+if __name__ == "__main__":
+    samples = [
+        '{"intents":[{"type":"hat","action":"bark"}]}',
+        '```json\n{"intents":[{"type":"hat","action":"bark"},]}\n```',
+        "{'intents':[{'type':'chat','text':'What is Ohm's law?'}]}",
+        '{"intents":[{"type":"hat","action":"sit"}]} Let me know if you need anything else!',
+        '{"intents":[{"type":"hat","action":"sit"}{"type":"hat","action":"bark"}]}',
+        '{"intents":[{"type":"hat","action":"sit"},{"type":"hat","action":"howl"},'
+        '{"type":"hat","action":"bark"},{"type":"hat","action":"wag_tail"},{"type":"hat","act',
+        '{"intents":[{"type":"hat","action":"sit"}',
+        'Sorry, I cannot help with that.',
+    ]
+    for sample in samples:
+        print(repair_json(sample))
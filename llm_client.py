@@ -7,4 +7,18 @@ class LLMClient(ABC):
 		Sends text to LLM and returns LLM response according to SYSTEM_PROMPT
 		"""
 		pass
-	
+
+
+class AsyncLLMClient(ABC):
+	@abstractmethod
+	async def parse_intents(self, user_text: str) -> dict:
+		"""
+		Awaitable version of LLMClient.parse_intents - must not block the event loop
+		"""
+		pass
+
+	async def aclose(self):
+		"""
+		Release any pooled connections held by the client
+		"""
+		pass
@@ -1,24 +1,355 @@
 # llm_intent_processor.py
+import asyncio
+import copy
+import inspect
+
+from intent_stream import IncrementalIntentParser
+from intent_schema import is_lossy
+
+from single_flight import SUPPRESSED, FOLLOWER
+from metrics import NULL_METRICS
+
+
+class BatchResult:
+    """One handle_batch item: intents, or the error that item raised."""
+    __slots__ = ("index", "text", "intents", "error")
+
+    def __init__(self, index, text, intents=None, error=None):
+        self.index = index
+        self.text = text
+        self.intents = intents
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        outcome = self.intents if self.ok else f"error={self.error!r}"
+        return f"BatchResult({self.index}, {self.text!r}, {outcome})"
+
+
 class LLMIntentProcessor:
-    def __init__(self, llm_client, preprocess_fn=None, normalise_fn=None):
+    def __init__(self, llm_client, preprocess_fn=None, normalise_fn=None, cache=None, fast_path=None,
+                 coalesce=None, metrics=None, validator=None):
         self.llm = llm_client
         self.preprocess_fn = preprocess_fn
         self.normalise_fn = normalise_fn
+        # optional template cache (cache_llm.IntentTemplateCache)
+        self.cache = cache
+        # optional rule-based pre-classifier (fast_path.RuleBasedClassifier)
+        self.fast_path = fast_path
+        # optional single-flight for identical in-flight utterances (single_flight.SingleFlight)
+        self.coalesce = coalesce
+        # optional per-stage latency histograms / counters (metrics.Metrics)
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        # optional LLM output check / local repair (intent_schema.IntentValidator)
+        self.validator = validator
 
-    def handle_text(self, text: str):
-
+    def preprocess(self, text: str) -> str:
         # optional preprocessing
-        clean_text = tex if not self.preprocess_fn else self.preprocess_fn(text, self.llm.model)
-
-        intents_json = self.llm.parse_intents(clean_text)
+        if not self.preprocess_fn:
+            return text
+        with self.metrics.timer("preprocess"):
+            return self.preprocess_fn(text, self.llm.model)
 
+    def normalise_intent(self, intent: dict) -> dict:
         # optional normalisation
+        if self.normalise_fn and "device" in intent:
+            intent["device"] = self.normalise_fn(intent["device"])
+        return intent
 
+    def normalise(self, intents_json: dict) -> dict:
         if (self.normalise_fn):
-            for intent in intents_json.get("intents", []):
-                if "device" in intent:
-                    intent["device"] = self.normalise_fn(intent["device"])
-            
+            with self.metrics.timer("normalise"):
+                for intent in intents_json.get("intents", []):
+                    self.normalise_intent(intent)
+
+        self.count_result(intents_json)
         return intents_json
 
+    def count_result(self, intents_json: dict):
+        if not self.metrics.enabled:
+            return
+        if "error" in intents_json:
+            self.metrics.inc("invalid_json", model=self.llm.model)
+        for intent in intents_json.get("intents", []):
+            self.count_intent(intent)
+
+    def count_intent(self, intent: dict):
+        self.metrics.inc("intents", type=intent.get("type", "unknown") if isinstance(intent, dict) else "unknown")
+
+    def validate(self, intents_json: dict):
+        """
+        (validated intents_json, cacheable). LLM output only - fast path and
+        cache results are already clean. A result the validator had to drop
+        intents / fields from or rebuild is used once but not cacheable.
+        """
+        if not self.validator:
+            return intents_json, True
+        with self.metrics.timer("validate"):
+            intents_json = self.validator.validate(intents_json)
+        if self.validator.last_repairs:
+            self.metrics.inc("repaired_output", model=self.llm.model)
+        return intents_json, not self.validator.last_lossy
+
+    def validate_intent(self, intent: dict):
+        """(validated intent or None, cacheable) for one streamed intent."""
+        if not self.validator:
+            return intent, True
+        repairs = []
+        intent = self.validator.validate_intent(intent, repairs)
+        if repairs:
+            self.metrics.inc("repaired_output", model=self.llm.model)
+        return intent, not is_lossy(repairs)
+
+    def lookup_cache(self, clean_text: str):
+        if not self.cache:
+            return None, None
+        with self.metrics.timer("cache_lookup"):
+            cached, entry = self.cache.lookup(clean_text)
+        self.metrics.inc("cache_lookups", result="miss" if cached is None else "hit")
+        return cached, entry
+
+    def store_cache(self, entry, intents_json: dict):
+        if self.cache:
+            with self.metrics.timer("cache_store"):
+                self.cache.store(entry, intents_json)
+
+    def classify_fast(self, text: str):
+        # Runs on the raw text so say text keeps its case and punctuation
+        if not self.fast_path:
+            return None
+        with self.metrics.timer("fast_path"):
+            intents_json, _ = self.fast_path.classify(text)
+        self.metrics.inc("fast_path", result="miss" if intents_json is None else "hit")
+        return intents_json
+
+    def handle_text(self, text: str):
+
+        fast = self.classify_fast(text)
+        if fast is not None:
+            return self.normalise(fast)
+
+        clean_text = self.preprocess(text)
+
+        cached, entry = self.lookup_cache(clean_text)
+        if cached is not None:
+            return self.normalise(cached)
+
+        with self.metrics.timer("llm", model=self.llm.model):
+            intents_json = self.llm.parse_intents(clean_text)
+        intents_json, cacheable = self.validate(intents_json)
+
+        if cacheable:
+            self.store_cache(entry, intents_json)
+
+        return self.normalise(intents_json)
+
+    async def handle_text_async(self, text: str):
+        """
+        Awaitable handle_text. Async clients (AsyncLLMClient) are awaited directly,
+        blocking clients are run in a worker thread so the event loop keeps running.
+        With coalesce set, identical utterances already in flight share one result;
+        duplicates suppressed by its window return None.
+        """
+        with self.metrics.timer("total"):
+            if not self.coalesce:
+                return await self._handle_text_async(text)
+            intents_json = await self.coalesce.run(self.coalesce.key(text), lambda: self._handle_text_async(text))
+            if intents_json is None:
+                self.metrics.inc("suppressed")
+            return intents_json
+
+    async def _handle_text_async(self, text: str):
+        fast = self.classify_fast(text)
+        if fast is not None:
+            return self.normalise(fast)
+
+        clean_text = self.preprocess(text)
+
+        cached, entry = self.lookup_cache(clean_text)
+        if cached is not None:
+            return self.normalise(cached)
+
+        intents_json, cacheable = await self.call_llm_async(clean_text)
+
+        if cacheable:
+            self.store_cache(entry, intents_json)
+
+        return self.normalise(intents_json)
+
+    async def call_llm_async(self, clean_text: str):
+        """
+        (validated LLM result, cacheable) - see validate(). Async clients are
+        awaited, blocking ones run in a worker thread.
+        """
+        with self.metrics.timer("llm", model=self.llm.model):
+            if inspect.iscoroutinefunction(self.llm.parse_intents):
+                intents_json = await self.llm.parse_intents(clean_text)
+            else:
+                intents_json = await asyncio.to_thread(self.llm.parse_intents, clean_text)
+        return self.validate(intents_json)
+
+    async def iter_batch(self, texts, concurrency=8, ordered=True):
+        """
+        Async generator of BatchResult for many utterances (offline re-labelling,
+        prompt validation, cache warming).
+
+        Fast path, preprocessing and cache lookups run for the whole batch up
+        front; the remaining distinct texts go to the LLM with at most
+        `concurrency` calls in flight. Results come in input order, or as
+        they complete with ordered=False. An item that raises yields a
+        BatchResult with its error and does not affect the others.
+        Duplicates share one LLM call and are never suppressed (coalesce is
+        not used).
+        """
+        texts = list(texts)
+        limit = asyncio.Semaphore(concurrency)
+        calls = {}          # clean text -> task of its (validated) LLM result
+        items = []
+
+        async def call(clean_text, entry):
+            async with limit:
+                intents_json, cacheable = await self.call_llm_async(clean_text)
+            if cacheable:
+                self.store_cache(entry, intents_json)
+            return intents_json
+
+        async def finish(index, text, call_task):
+            try:
+                # Items sharing a call each get their own copy to normalise
+                intents_json = copy.deepcopy(await call_task)
+                return BatchResult(index, text, self.normalise(intents_json))
+            except Exception as e:
+                return BatchResult(index, text, error=e)
+
+        async def done(result):
+            return result
+
+        for index, text in enumerate(texts):
+            try:
+                fast = self.classify_fast(text)
+                if fast is not None:
+                    items.append(done(BatchResult(index, text, self.normalise(fast))))
+                    continue
+                clean_text = self.preprocess(text)
+                cached, entry = self.lookup_cache(clean_text)
+                if cached is not None:
+                    items.append(done(BatchResult(index, text, self.normalise(cached))))
+                    continue
+            except Exception as e:
+                items.append(done(BatchResult(index, text, error=e)))
+                continue
+            if clean_text not in calls:
+                calls[clean_text] = asyncio.ensure_future(call(clean_text, entry))
+            items.append(finish(index, text, calls[clean_text]))
+
+        tasks = [asyncio.ensure_future(item) for item in items]
+        try:
+            for next_result in (tasks if ordered else asyncio.as_completed(tasks)):
+                yield await next_result
+        finally:
+            # Consumer stopped early: don't leave LLM calls running
+            for task in [*tasks, *calls.values()]:
+                task.cancel()
+
+    async def handle_batch_async(self, texts, concurrency=8) -> list:
+        """BatchResult per text, in input order."""
+        return [result async for result in self.iter_batch(texts, concurrency)]
+
+    def handle_batch(self, texts, concurrency=8) -> list:
+        """Blocking handle_batch_async for scripts; not for use inside a running event loop."""
+        async def run():
+            try:
+                return await self.handle_batch_async(texts, concurrency)
+            finally:
+                # Pooled sessions belong to this run's event loop
+                if inspect.iscoroutinefunction(getattr(self.llm, "aclose", None)):
+                    await self.llm.aclose()
+        return asyncio.run(run())
+
+    async def stream_text_async(self, text: str):
+        """
+        Async generator yielding normalised intents one at a time.
+        Clients with stream_intents() are streamed, so the first intent is
+        available before the LLM has finished; other clients fall back to
+        handle_text_async. Timed and counted like handle_text_async.
+        """
+        stream = getattr(self.llm, "stream_intents", None)
+        if not inspect.isasyncgenfunction(stream):
+            intents_json = await self.handle_text_async(text)
+            for intent in (intents_json or {}).get("intents", []):
+                yield intent
+            return
+
+        # Includes time the caller spends between intents, as the stream is consumed
+        with self.metrics.timer("total"):
+            if not self.coalesce:
+                async for intent in self._stream_text_async(text, stream):
+                    yield intent
+                return
+
+            key = self.coalesce.key(text)
+            role, future = self.coalesce.begin(key)
+            if role == SUPPRESSED:
+                self.metrics.inc("suppressed")
+                return
+            if role == FOLLOWER:
+                for intent in (await self.coalesce.follow(future)).get("intents", []):
+                    yield intent
+                return
+
+            intents = []
+            try:
+                async for intent in self._stream_text_async(text, stream):
+                    intents.append(intent)
+                    yield intent
+            except BaseException as e:
+                self.coalesce.finish(key, future, error=e)
+                raise
+            self.coalesce.finish(key, future, {"intents": intents})
+
+    async def _stream_text_async(self, text: str, stream):
+        fast = self.classify_fast(text)
+        if fast is not None:
+            for intent in self.normalise(fast)["intents"]:
+                yield intent
+            return
+
+        clean_text = self.preprocess(text)
+
+        cached, entry = self.lookup_cache(clean_text)
+        if cached is not None:
+            for intent in self.normalise(cached)["intents"]:
+                yield intent
+            return
+
+        intents = []
+        parser = IncrementalIntentParser()
+        cacheable = True
+        with self.metrics.timer("llm_stream", model=self.llm.model):
+            async for intent in stream(clean_text, parser=parser):
+                intent, clean = self.validate_intent(intent)
+                cacheable = cacheable and clean
+                if intent is None:
+                    continue
+                intents.append(intent)
+                self.count_intent(intent)
+                yield self.normalise_intent(intent)
+
+        if not parser.finished:
+            # No complete "intents" array: the repair parser gets the whole reply
+            self.metrics.inc("invalid_json", model=self.llm.model)
+            for intent in parser.recover():
+                intent, _ = self.validate_intent(intent)
+                if intent is None:
+                    continue
+                intents.append(intent)
+                self.count_intent(intent)
+                yield self.normalise_intent(intent)
 
+        # Only a complete, cleanly parsed response is worth remembering - prose,
+        # truncated or garbled output would otherwise be replayed as [] for hours
+        if cacheable and parser.finished and parser.intents and not parser.skipped:
+            self.store_cache(entry, {"intents": intents})
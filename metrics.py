@@ -0,0 +1,170 @@
+# metrics.py
+import asyncio
+from time import perf_counter
+
+# Upper bounds in seconds, Prometheus-style cumulative buckets
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            yield bound, total
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "labels", "start")
+
+    def __init__(self, metrics, stage, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _label_key(labels: dict):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and counters for the intent pipeline.
+
+        with metrics.timer("llm", model="gemma3:4b"): ...
+        metrics.inc("intents", type="hat")
+
+    Disabled instances return a shared no-op timer and ignore inc(), so
+    instrumentation costs one attribute check per call site.
+    render() gives Prometheus text format; serve_metrics() exposes it over HTTP.
+    """
+    def __init__(self, enabled=True, prefix="intent_router", buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.buckets = buckets
+        self.histograms = {}    # (stage, label_key) -> Histogram
+        self.counters = {}      # (name, label_key) -> int
+
+    def timer(self, stage: str, **labels):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage, labels)
+
+    def observe(self, stage: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        key = (stage, _label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def inc(self, name: str, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        """Compact dict (count / mean ms per stage, counter values) for logging."""
+        stages = {
+            stage + _format_labels(labels): {
+                "count": h.count,
+                "mean_ms": round(h.sum / h.count * 1000, 2) if h.count else 0.0,
+            }
+            for (stage, labels), h in self.histograms.items()
+        }
+        counters = {name + _format_labels(labels): value for (name, labels), value in self.counters.items()}
+        return {"stages": stages, "counters": counters}
+
+    def render(self) -> str:
+        lines = []
+        name = f"{self.prefix}_stage_seconds"
+        if self.histograms:
+            lines.append(f"# TYPE {name} histogram")
+        for (stage, labels), h in sorted(self.histograms.items()):
+            key = (("stage", stage),) + labels
+            for bound, total in h.cumulative():
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {total}")
+            lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {h.count}")
+            lines.append(f"{name}_sum{_format_labels(key)} {h.sum:.6f}")
+            lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        typed = set()
+        for (counter, labels), value in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{counter}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+NULL_METRICS = Metrics(enabled=False)
+
+
+async def serve_metrics(metrics: Metrics, host="127.0.0.1", port=9108):
+    """
+    Minimal HTTP endpoint: GET /metrics returns metrics.render(). Bound to
+    localhost by default; pass host="0.0.0.0" for a remote Prometheus.
+    """
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            path = request.split()[1] if len(request.split()) > 1 else b"/"
+            if path == b"/metrics":
+                status, body = "200 OK", metrics.render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,139 @@
+# micro_batch.py
+import asyncio
+import inspect
+
+from llm_client import AsyncLLMClient
+
+BATCH_INSTRUCTIONS = """Several numbered user texts follow. Classify EACH one separately using the rules above.
+Return ONLY one JSON object with one result per input, in the same order:
+{"results":[{"id":1,"intents":[...]},{"id":2,"intents":[...]}]}
+"""
+
+
+def build_batch_prompt(texts) -> str:
+    numbered = "\n".join(f"{i}. {text}" for i, text in enumerate(texts, 1))
+    return f"{BATCH_INSTRUCTIONS}\n{numbered}"
+
+
+def split_batch_response(resp_json: dict, count: int):
+    """
+    Split {"results": [{"id": n, "intents": [...]}, ...]} into per-utterance
+    {"intents": [...]} dicts. Returns None if the response does not hold
+    exactly one well-formed result per input.
+    """
+    results = resp_json.get("results") if isinstance(resp_json, dict) else None
+    if not isinstance(results, list) or len(results) != count:
+        return None
+    if not all(isinstance(r, dict) and isinstance(r.get("intents"), list) for r in results):
+        return None
+    if all("id" in r for r in results):
+        # Trust ids over position, but only if they are exactly 1..count
+        try:
+            by_id = {int(r["id"]): r for r in results}
+        except (TypeError, ValueError):
+            return None
+        if sorted(by_id) != list(range(1, count + 1)):
+            return None
+        results = [by_id[i] for i in range(1, count + 1)]
+    return [{"intents": r["intents"]} for r in results]
+
+
+class MicroBatcher(AsyncLLMClient):
+    """
+    Micro-batching stage in front of an LLMClient / AsyncLLMClient.
+
+    parse_intents() calls made within `window` seconds of each other are
+    packed, up to `max_batch` at a time, into one request with numbered
+    inputs, so the system prompt is evaluated once for the whole backlog.
+    The response is split back into per-utterance {"intents": [...]}
+    results; a mismatched or malformed batch is retried as one call per
+    utterance. A lone utterance is sent as a normal request.
+    """
+    def __init__(self, llm, max_batch=4, window=0.05):
+        self.llm = llm
+        self.max_batch = max_batch
+        self.window = window
+        self._pending = []       # (text, future)
+        self._timer = None
+        self._tasks = set()
+        self.batches = 0
+        self.batched_items = 0
+        self.fallbacks = 0
+
+    @property
+    def model(self):
+        return self.llm.model
+
+    async def parse_intents(self, user_text: str) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((user_text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _call(self, text: str) -> dict:
+        if inspect.iscoroutinefunction(self.llm.parse_intents):
+            return await self.llm.parse_intents(text)
+        return await asyncio.to_thread(self.llm.parse_intents, text)
+
+    async def _run_single(self, text, future):
+        try:
+            result = await self._call(text)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    async def _run_batch(self, batch):
+        if len(batch) == 1:
+            await self._run_single(*batch[0])
+            return
+
+        results = None
+        try:
+            resp_json = await self._call(build_batch_prompt([text for text, _ in batch]))
+            results = split_batch_response(resp_json, len(batch))
+        except Exception as e:
+            print(f"WARNING: batch of {len(batch)} failed: {e}")
+
+        if results is None:
+            self.fallbacks += 1
+            await asyncio.gather(*(self._run_single(text, future) for text, future in batch))
+            return
+
+        self.batches += 1
+        self.batched_items += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "batched_items": self.batched_items,
+            "fallbacks": self.fallbacks,
+        }
+
+    async def aclose(self):
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        if hasattr(self.llm, "aclose"):
+            await self.llm.aclose()
@@ -1,6 +1,42 @@
+import json
+from types import SimpleNamespace
+
+
 class MockLLMClient:
     def parse_intents(self, user_text):
         # Return dummy JSON for testing
         return {"intents": [{"type": "hat", "action": "shake_paw"}]}
 
 
+# -------------------------------
+# Offline stand-in for google.genai.Client
+# -------------------------------
+def _genai_response(text: str):
+    part = SimpleNamespace(text=text)
+    return SimpleNamespace(text=text, candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class StandInGenaiClient:
+    """
+    Minimal genai.Client stand-in (models / aio.models / caches) for running
+    GeminiClient offline. Every call is recorded in `calls` so tests can check
+    that the client is reused and the system prompt is not resent per message.
+    respond(contents, config) -> JSON text; defaults to MockLLMClient's intents.
+    """
+    def __init__(self, respond=None):
+        self.respond = respond or (lambda contents, config: json.dumps(MockLLMClient().parse_intents(contents)))
+        self.calls = []
+        self.models = SimpleNamespace(generate_content=self._generate)
+        self.caches = SimpleNamespace(create=self._create_cache)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._agenerate))
+
+    def _create_cache(self, model, config):
+        self.calls.append(("caches.create", model))
+        return SimpleNamespace(name=f"cachedContents/stand-in-{len(self.calls)}")
+
+    def _generate(self, model, contents, config=None):
+        self.calls.append(("generate_content", model, contents))
+        return _genai_response(self.respond(contents, config))
+
+    async def _agenerate(self, model, contents, config=None):
+        return self._generate(model, contents, config)
@@ -7,6 +7,7 @@ MODEL_CAPABILITIES = {
         "supports_complex_json": False,
         "preferred_for_intents": True,
         "supports_nested_quotes": False,
+        "prompt_variant": "full",
     },
     "gemma3:4b": {
         "max_input_length": 4000,
@@ -14,6 +15,7 @@ MODEL_CAPABILITIES = {
         "supports_complex_json": True,
         "preferred_for_intents": True,
         "supports_nested_quotes": True,
+        "prompt_variant": "compact",
     },
     "gemini-alpha": {
         "max_input_length": 8000,
@@ -21,6 +23,7 @@ MODEL_CAPABILITIES = {
         "supports_complex_json": True,
         "preferred_for_intents": True,
         "supports_nested_quotes": True,
+        "prompt_variant": "compact",
     }
 }
 
@@ -0,0 +1,192 @@
+# multi_backend.py
+import asyncio
+import inspect
+from collections import deque
+from time import monotonic
+
+from llm_client import AsyncLLMClient
+
+
+class BackendProfile:
+    """
+    Moving latency / error profile of one backend.
+    - latency: EWMA of successful call times plus the last `window` samples for p90
+    - error_rate: EWMA of failed calls (exceptions, timeouts, invalid JSON)
+    - after max_failures consecutive failures the backend is marked down for
+      `cooldown` seconds, then tried again
+    """
+    def __init__(self, name, client, window=50, alpha=0.2, max_failures=3, cooldown=30):
+        self.name = name
+        self.client = client
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.samples = deque(maxlen=window)
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.down_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def healthy(self, now=None) -> bool:
+        return (monotonic() if now is None else now) >= self.down_until
+
+    def record(self, latency: float, ok: bool):
+        self.calls += 1
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.failures = 0
+            self.samples.append(latency)
+            self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+            return
+        self.errors += 1
+        self.failures += 1
+        if self.failures >= self.max_failures:
+            self.down_until = monotonic() + self.cooldown
+            print(f"WARNING: backend {self.name} marked down for {self.cooldown}s after {self.failures} failures")
+
+    def record_cancelled(self, elapsed: float):
+        """
+        A call cancelled after `elapsed` seconds (lost a hedge race) took at
+        least that long. Counted as a sample only when slower than the
+        profile, so a primary that has become slow stops looking fast.
+        """
+        if self.latency is not None and elapsed <= self.latency:
+            return
+        self.samples.append(elapsed)
+        self.latency = elapsed if self.latency is None else self.latency + self.alpha * (elapsed - self.latency)
+
+    def expected_cost(self, timeout: float) -> float:
+        # Unmeasured backends cost 0 so they get probed; failures cost a timeout
+        return (self.latency or 0.0) + self.error_rate * timeout
+
+    def p90(self, min_samples=5):
+        if len(self.samples) < min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))]
+
+    def stats(self) -> dict:
+        return {
+            "healthy": self.healthy(),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "p90_ms": round(self.p90() * 1000, 1) if self.p90() is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "calls": self.calls,
+            "errors": self.errors,
+        }
+
+
+def valid_response(result) -> bool:
+    return isinstance(result, dict) and "error" not in result
+
+
+class MultiBackendClient(AsyncLLMClient):
+    """
+    Composite LLM client over several backends, e.g.
+        {"hailo": AsyncHailoClient(...), "ollama": AsyncOllamaClient(...)}
+
+    Each request goes to the healthy backend with the lowest expected cost
+    (moving latency + error rate). With hedge=True, if the primary has not
+    answered by its p90 (hedge_delay until enough samples exist) the next
+    backend is also asked and the first valid answer wins. A call failing,
+    returning invalid JSON or exceeding `timeout` fails over to the next
+    backend. Backends are tried in configured order until they have samples.
+    """
+    def __init__(self, backends: dict, hedge=True, hedge_delay=2.0, timeout=30, **profile_kwargs):
+        self.backends = [BackendProfile(name, client, **profile_kwargs) for name, client in backends.items()]
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.hedged = 0
+        self.failovers = 0
+
+    @property
+    def model(self):
+        # Preprocessing follows the first configured (preferred) backend
+        return self.backends[0].client.model
+
+    def rank(self) -> list:
+        now = monotonic()
+        healthy = [b for b in self.backends if b.healthy(now)]
+        down = [b for b in self.backends if not b.healthy(now)]
+        # sorted() is stable, so ties keep configured order; down backends are a last resort
+        return sorted(healthy, key=lambda b: b.expected_cost(self.timeout)) + sorted(down, key=lambda b: b.down_until)
+
+    async def _call(self, backend: BackendProfile, user_text: str):
+        parse = backend.client.parse_intents
+        start = monotonic()
+        try:
+            if inspect.iscoroutinefunction(parse):
+                result = await asyncio.wait_for(parse(user_text), self.timeout)
+            else:
+                result = await asyncio.wait_for(asyncio.to_thread(parse, user_text), self.timeout)
+        except asyncio.CancelledError:
+            # Lost a hedge race - not the backend's fault, but it was at least this slow
+            backend.record_cancelled(monotonic() - start)
+            raise
+        except Exception:
+            backend.record(monotonic() - start, ok=False)
+            raise
+        backend.record(monotonic() - start, ok=valid_response(result))
+        return result
+
+    async def parse_intents(self, user_text: str) -> dict:
+        order = self.rank()
+        tasks = {}          # task -> backend
+        errors = []
+        fallback = None     # last invalid (but parsed) response, returned if nothing valid arrives
+
+        def launch():
+            backend = order[len(errors) + len(tasks)]
+            tasks[asyncio.ensure_future(self._call(backend, user_text))] = backend
+
+        launch()
+        try:
+            while tasks:
+                hedge_after = None
+                if self.hedge and len(tasks) == 1 and not errors and len(order) > 1:
+                    primary = next(iter(tasks.values()))
+                    hedge_after = primary.p90() or self.hedge_delay
+
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedged += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    backend = tasks.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        errors.append(f"{backend.name}: {e!r}")
+                        continue
+                    if valid_response(result):
+                        return result
+                    errors.append(f"{backend.name}: invalid response")
+                    fallback = result
+
+                if not tasks and len(errors) < len(order):
+                    self.failovers += 1
+                    launch()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if fallback is not None:
+            return fallback
+        raise RuntimeError(f"All LLM backends failed: {'; '.join(errors)}")
+
+    def stats(self) -> dict:
+        return {
+            "hedged": self.hedged,
+            "failovers": self.failovers,
+            "backends": {b.name: b.stats() for b in self.backends},
+        }
+
+    async def aclose(self):
+        for backend in self.backends:
+            if hasattr(backend.client, "aclose"):
+                await backend.client.aclose()
@@ -4,10 +4,20 @@ SYNONYMS = {
     "neo": ["neo", "neopixel", "neolight"],
 }
 
-def normalise_object(text_object: str) -> str:
-    for key, variants in SYNONYMS.items():
-        if text_object.lower() in variants:
-            return key
-    return text_object
+# variant -> key, rebuilt only when SYNONYMS changes
+_variant_index = {}
+_indexed_synonyms = None
 
+def _get_variant_index() -> dict:
+    global _variant_index, _indexed_synonyms
+    if _indexed_synonyms != SYNONYMS:
+        _indexed_synonyms = {key: list(variants) for key, variants in SYNONYMS.items()}
+        _variant_index = {}
+        for key, variants in _indexed_synonyms.items():
+            for variant in variants:
+                # first key listing a variant wins, as with the original scan
+                _variant_index.setdefault(variant, key)
+    return _variant_index
 
+def normalise_object(text_object: str) -> str:
+    return _get_variant_index().get(text_object.lower(), text_object)
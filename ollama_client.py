@@ -1,50 +1,256 @@
+import asyncio
 import json
+import httpx
 import requests
-from llm_client import LLMClient
-import re
-
-def safe_json_load(content: str) -> dict:
-    try:
-        start = content.index("{")
-        end = content.rindex("}") + 1
-        json_text = content[start:end]
-        return json.loads(json_text)
-    except (ValueError, json.JSONDecodeError):
-        return {"error": "invalid_json"}
+from llm_client import LLMClient, AsyncLLMClient
+from intent_stream import IncrementalIntentParser
+from json_repair import repair_json
+from metrics import NULL_METRICS
+from prompt_registry import estimate_tokens
+
+def response_text(resp_json: dict) -> str:
+    """Generated text of an /api/generate or /api/chat response (or stream chunk)."""
+    message = resp_json.get("message")
+    if message is not None:
+        return message.get("content", "")
+    return resp_json.get("response", "")
+
+def generate_timings(resp_json: dict) -> dict:
+    """Prompt-eval vs generation time (ms) from an Ollama response."""
+    ms = lambda key: round(resp_json.get(key, 0) / 1e6, 1)
+    return {
+        "load_ms": ms("load_duration"),
+        "prompt_eval_ms": ms("prompt_eval_duration"),
+        "eval_ms": ms("eval_duration"),
+        "total_ms": ms("total_duration"),
+        "prompt_eval_count": resp_json.get("prompt_eval_count", 0),
+        "eval_count": resp_json.get("eval_count", 0),
+    }
 
 class OllamaClient(LLMClient):
-    def __init__(self, prompt, model="gemma3:1b", host="http://localhost:11434"):
+    """
+    reuse_prefix: send the prompt as the system message of /api/chat, so every
+    request starts with the same chat-templated prefix and the server reuses
+    its evaluated KV cache instead of re-evaluating the rules. The prefix is
+    primed once; keep_alive keeps the model (and that cache) resident between
+    requests. Each request is a complete templated prompt, so an evicted
+    prefix only costs time: it shows up as a prompt_eval_count that covers the
+    prefix again on top of the user message, and is counted as "prefix_evicted".
+
+    examples: an ExampleIndex. self.prompt is then the rules only and each
+    request appends the examples retrieved for its utterance (in the user
+    message when reuse_prefix is on).
+
+    schema: a JSON schema (intent_schema.INTENTS_SCHEMA) sent as Ollama's
+    `format`, so generation is constrained to the intents shape.
+
+    Per-call timings are kept in last_timings and passed to on_timings, the
+    JSON repairs applied to the last response in last_repairs.
+    With metrics set, the HTTP round trip and the fence stripping / JSON
+    parsing are timed as the "http" and "parse" stages.
+    """
+    def __init__(self, prompt, model="gemma3:1b", host="http://localhost:11434",
+                 reuse_prefix=False, keep_alive="30m", on_timings=None, metrics=None, examples=None,
+                 schema=None):
         self.model = model
         self.host = host.rstrip("/")
         self.prompt = prompt
+        self.reuse_prefix = reuse_prefix
+        self.keep_alive = keep_alive
+        self.on_timings = on_timings
+        self.path = "/api/chat" if reuse_prefix else "/api/generate"
+        self.prefix_tokens = None
+        self.last_timings = {}
+        self.last_repairs = []
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.examples = examples
+        self.schema = schema
 
-    def parse_json_safe(self, raw_text: str):
-        try:
-            return json.loads(raw_text)
-        except json.JSONDecodeError:
-            # Print raw text for debugging
-            print("WARNING: LLM returned invalid JSON:", repr(raw_text))
-            return {"intents": []}
+    def parse_response(self, resp_json: dict) -> dict:
+        content = response_text(resp_json)
+        intents_json, self.last_repairs = repair_json(content)
+        if self.last_repairs:
+            print(f"WARNING: repaired LLM JSON {self.last_repairs}: {content!r}")
+        for repair in self.last_repairs:
+            self.metrics.inc("json_repairs", model=self.model, repair=repair)
+        return intents_json
 
-    def parse_intents(self, user_text: str) -> dict:
+    def build_payload(self, user_text: str, stream: bool = False) -> dict:
+        shots = self.examples.render(user_text) if self.examples else ""
         payload = {
             "model": self.model,
-            "prompt": f"{self.prompt}\n\nUser text: {user_text}",
-            "stream": False,
+            "stream": stream,
             "options": {"temperature": 0}
         }
-        r = requests.post(f"{self.host}/api/generate", json=payload, timeout=90)
-        r.raise_for_status()
+        if self.reuse_prefix:
+            # System message first and byte-identical on every request: the shared KV prefix
+            payload["messages"] = [
+                {"role": "system", "content": self.prompt},
+                {"role": "user", "content": f"{shots}\n\nUser text: {user_text}".lstrip()},
+            ]
+        else:
+            payload["prompt"] = f"{self.prompt}{shots}\n\nUser text: {user_text}"
+        if self.schema is not None:
+            payload["format"] = self.schema
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def build_prime_payload(self) -> dict:
+        # Same system message as every request, an empty utterance and one generated token
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.prompt},
+                {"role": "user", "content": "User text:"},
+            ],
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {"temperature": 0, "num_predict": 1}
+        }
+
+    def store_prefix(self, resp_json: dict):
+        self.prefix_tokens = resp_json.get("prompt_eval_count", 0)
+        print(f"Prompt prefix primed: {self.prefix_tokens} tokens "
+              f"in {generate_timings(resp_json)['prompt_eval_ms']} ms")
 
-        resp_str = r.content.decode("utf-8")
+    def record_timings(self, resp_json: dict, payload: dict = None):
+        timings = generate_timings(resp_json)
+        timings["prefix_reused"] = False
+        if self.prefix_tokens:
+            # A long user message (many retrieved examples) can outgrow the prefix on its own,
+            # so judge only what was evaluated beyond the user message. Its size is estimated:
+            # more than half the prefix means the prefix was evaluated again.
+            user_tokens = estimate_tokens(payload["messages"][-1]["content"]) if payload else 0
+            timings["prefix_reused"] = timings["prompt_eval_count"] - user_tokens < self.prefix_tokens / 2
+        if self.prefix_tokens and not timings["prefix_reused"]:
+            # The server evaluated the whole prefix again: evicted (model reload, other prompts)
+            print(f"WARNING: prompt prefix not reused ({timings['prompt_eval_count']} tokens evaluated, "
+                  f"prefix {self.prefix_tokens})")
+            self.metrics.inc("prefix_evicted", model=self.model)
+        self.last_timings = timings
+        if self.on_timings:
+            self.on_timings(self.model, timings)
 
-        resp_json = json.loads(resp_str)
-        # Remove 'json' header
-        # print(resp_json)
-        clean_text = re.sub(r"```json\s*|\s*```", "", resp_json['response']).strip()
+    def prime_prefix(self):
+        try:
+            r = requests.post(f"{self.host}{self.path}", json=self.build_prime_payload(), timeout=90)
+            r.raise_for_status()
+            self.store_prefix(r.json())
+        except requests.RequestException as e:
+            # Requests still work, just without a known prefix size; retried next call
+            print(f"WARNING: could not prime prompt prefix: {e}")
+            self.prefix_tokens = None
+
+    def parse_intents(self, user_text: str) -> dict:
+        if self.reuse_prefix and self.prefix_tokens is None:
+            self.prime_prefix()
+        payload = self.build_payload(user_text)
+        with self.metrics.timer("http", model=self.model):
+            r = requests.post(f"{self.host}{self.path}", json=payload, timeout=90)
+            r.raise_for_status()
+
+        with self.metrics.timer("parse", model=self.model):
+            resp_str = r.content.decode("utf-8")
+
+            resp_json = json.loads(resp_str)
+            # print(resp_json)
+            self.record_timings(resp_json, payload)
+            return self.parse_response(resp_json)
+
+    def stream_intents(self, user_text: str, parser=None):
+        """
+        Streaming parse_intents: yields each intent dict as soon as its closing
+        brace has been generated, instead of waiting for the whole response.
+        Pass an IncrementalIntentParser as `parser` to check afterwards
+        whether the response was complete (parser.finished).
+        """
+        if self.reuse_prefix and self.prefix_tokens is None:
+            self.prime_prefix()
+        parser = parser if parser is not None else IncrementalIntentParser()
+        payload = self.build_payload(user_text, stream=True)
+        with requests.post(f"{self.host}{self.path}", json=payload, timeout=90, stream=True) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                yield from parser.feed(response_text(chunk))
+                if chunk.get("done"):
+                    self.record_timings(chunk, payload)
+                if chunk.get("done") or parser.finished:
+                    break
+
+
+class AsyncOllamaClient(OllamaClient, AsyncLLMClient):
+    """
+    Non-blocking OllamaClient. One pooled keep-alive HTTP session is shared by
+    every request so concurrent utterances reuse open connections.
+    """
+    def __init__(self, prompt, model="gemma3:1b", host="http://localhost:11434",
+                 timeout=90, max_connections=8, **kwargs):
+        super().__init__(prompt, model=model, host=host, **kwargs)
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.session = None
+        self._priming = None
+
+    def _get_session(self) -> httpx.AsyncClient:
+        # Created lazily so the session binds to the running event loop
+        if self.session is None:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self.session = httpx.AsyncClient(base_url=self.host, timeout=self.timeout, limits=limits)
+        return self.session
+
+    async def prime_prefix(self):
+        # Concurrent first requests share one priming call
+        if self._priming is None or self._priming.done():
+            self._priming = asyncio.ensure_future(self._prime())
+        # A cancelled waiter must not cancel the priming the others share
+        await asyncio.shield(self._priming)
+
+    async def _prime(self):
+        try:
+            r = await self._get_session().post(self.path, json=self.build_prime_payload())
+            r.raise_for_status()
+            self.store_prefix(r.json())
+        except httpx.HTTPError as e:
+            print(f"WARNING: could not prime prompt prefix: {e}")
+            self.prefix_tokens = None
 
-        # Load JSON from LLM
-        return safe_json_load(clean_text)
+    async def parse_intents(self, user_text: str) -> dict:
+        if self.reuse_prefix and self.prefix_tokens is None:
+            await self.prime_prefix()
+        payload = self.build_payload(user_text)
+        with self.metrics.timer("http", model=self.model):
+            r = await self._get_session().post(self.path, json=payload)
+            r.raise_for_status()
 
+        with self.metrics.timer("parse", model=self.model):
+            resp_json = r.json()
+            self.record_timings(resp_json, payload)
+            return self.parse_response(resp_json)
 
+    async def stream_intents(self, user_text: str, parser=None):
+        if self.reuse_prefix and self.prefix_tokens is None:
+            await self.prime_prefix()
+        parser = parser if parser is not None else IncrementalIntentParser()
+        payload = self.build_payload(user_text, stream=True)
+        async with self._get_session().stream("POST", self.path, json=payload) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                for intent in parser.feed(response_text(chunk)):
+                    yield intent
+                if chunk.get("done"):
+                    self.record_timings(chunk, payload)
+                if chunk.get("done") or parser.finished:
+                    break
 
+    async def aclose(self):
+        if self.session is not None:
+            await self.session.aclose()
+            self.session = None
@@ -0,0 +1,66 @@
+# prompt_registry.py
+import re
+
+from SYSTEM_PROMPT import SYSTEM_PROMPT, COMPACT_SYSTEM_PROMPT
+from model_capabilities import get_model_capability
+
+# variant name -> system prompt
+PROMPT_VARIANTS = {
+    "full": SYSTEM_PROMPT,              # repeated examples, for small models (1b)
+    "compact": COMPACT_SYSTEM_PROMPT,   # one example per behaviour, for 4b and up
+}
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|\s+|[^\w\s]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough BPE-style token count without a tokenizer: about one token per
+    short word, one more per ~5 further letters, and symbol runs such as
+    '":"' merged in pairs.
+    Good enough to compare prompt variants and budget a request.
+    """
+    tokens = 0
+    for piece in TOKEN_PATTERN.findall(text):
+        if piece.isspace():
+            # Newline runs become their own token; single spaces join the next word
+            tokens += piece.count("\n") > 0
+        elif piece.isalpha():
+            tokens += 1 + (len(piece) - 1) // 5
+        elif piece.isdigit():
+            tokens += (len(piece) + 2) // 3
+        else:
+            tokens += (len(piece) + 1) // 2
+    return tokens
+
+
+def prompt_variant_for(model_name: str) -> str:
+    cap = get_model_capability(model_name)
+    variant = cap.get("prompt_variant")
+    if variant in PROMPT_VARIANTS:
+        return variant
+    # Unlisted models: capability tier decides
+    return "compact" if cap.get("supports_complex_json") else "full"
+
+
+def get_system_prompt(model_name: str) -> str:
+    return PROMPT_VARIANTS[prompt_variant_for(model_name)]
+
+
+def prompt_budget(model_name: str, user_text: str = "") -> dict:
+    """Estimated prompt tokens for one request to model_name."""
+    system_tokens = estimate_tokens(get_system_prompt(model_name))
+    user_tokens = estimate_tokens(user_text)
+    return {
+        "variant": prompt_variant_for(model_name),
+        "system_tokens": system_tokens,
+        "user_tokens": user_tokens,
+        "total_tokens": system_tokens + user_tokens,
+    }
+
+
+if __name__ == "__main__":
+    for name, prompt in PROMPT_VARIANTS.items():
+        print(f"{name:8} {len(prompt):6} chars  ~{estimate_tokens(prompt)} tokens")
+    for model in ("gemma3:1b", "gemma3:4b", "gemini-alpha", "llama3.2:3b"):
+        print(model, prompt_budget(model, "Sleep for 10 seconds. Turn NEO lights red. Shake your paw"))
@@ -0,0 +1,102 @@
+# semantic_cache.py
+import re
+from collections import OrderedDict
+
+# Spoken variants of one word. Every other word that is not a stopword must match
+# exactly, so an unknown device, room or extra clause is never answered from a
+# template learnt for a different one ("turn the radio on" vs "turn the tv on").
+# Negations and question words are kept as words, so "don't turn the lamp on" and
+# "is the lamp on?" never reuse "turn the lamp on".
+ALIASES = {
+    "wait": "sleep", "pause": "sleep",
+    "switch": "turn", "make": "turn", "set": "turn", "change": "turn", "put": "turn",
+    "don": "not", "dont": "not", "never": "not",
+    "are": "is", "does": "do",
+}
+# Light verbs ("turn the lamp blue", "lamp blue") are dropped unless they are the
+# whole clause - "turn" alone is the PiDog action
+LIGHT_VERBS = {"turn"}
+# Words that carry no meaning for routing
+STOPWORDS = {
+    "the", "a", "an", "to", "my", "your", "it", "please", "can", "could", "would",
+    "you", "me", "for", "now", "just", "kindly", "go", "room", "percent", "t",
+}
+CLAUSE_SPLIT = re.compile(r"\s*(?:,|\.|;|\band\b|\bthen\b|\bfinally\b)\s*")
+WORD = re.compile(r"<[A-Z]+\d*>|[a-z_]+")
+
+
+def _word(word: str) -> str:
+    word = ALIASES.get(word, word)
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        # "lights" / "seconds" - applied to both sides, so only consistency matters
+        word = ALIASES.get(word[:-1], word[:-1])
+    return word
+
+
+def signature(template_text: str) -> tuple:
+    """
+    Per clause, the sorted non-stopword words of a template key, aliases
+    applied, e.g. "turn on the lamp and dim it to <VAR1>" -> (("lamp", "on"), ("<VAR1>", "dim")).
+    """
+    clauses = []
+    for clause in CLAUSE_SPLIT.split(template_text):
+        words = [_word(w) for w in WORD.findall(clause) if w not in STOPWORDS]
+        if len(words) > 1:
+            words = [w for w in words if w not in LIGHT_VERBS] or words
+        if words:
+            clauses.append(tuple(sorted(words)))
+    return tuple(clauses)
+
+
+class SemanticIntentCache:
+    """
+    Paraphrase tier behind the exact template cache (cache_llm.IntentTemplateCache).
+
+    Template keys are reduced to their signature() - the same words per
+    clause up to stopwords, word order and ALIASES - and templates are kept
+    in a dict by signature, so "make the lamp blue" reuses the template
+    learnt from "turn the lamp blue" and refills it with the new slot
+    values, while "turn the radio on" never reuses "turn the tv on".
+    Templates with chat intents are not stored, their text is not a slot.
+    Holds up to max_entries signatures, least recently used dropped first.
+    Check precision / recall with TESTS/semantic_cache_report.py.
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # signature -> (key, template)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key: str):
+        """(template, key it was learnt from) for a template key with a stored signature, or (None, None)."""
+        key_signature = signature(key)
+        entry = self._entries.get(key_signature)
+        if entry is None:
+            self.misses += 1
+            return None, None
+        self._entries.move_to_end(key_signature)
+        self.hits += 1
+        learnt_from, template = entry
+        return template, learnt_from
+
+    def store(self, key: str, template: list) -> bool:
+        if any(step.get("type") == "chat" for step in template):
+            return False
+        key_signature = signature(key)
+        self._entries[key_signature] = (key, template)
+        self._entries.move_to_end(key_signature)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,111 @@
+# single_flight.py
+import asyncio
+import copy
+from time import monotonic
+
+LEADER = "leader"
+FOLLOWER = "follower"
+SUPPRESSED = "suppressed"
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight requests.
+
+    The first request for a key does the work; identical requests arriving
+    while it runs wait on the same future instead of starting their own.
+
+    window: duplicates arriving within `window` seconds of the first copy are
+    suppressed (typically a retried QoS 1 publish or the same text on both
+    stt/text and keybd/text) - they get None and nothing is re-published.
+    Later duplicates still in flight share the result and re-publish it.
+    window=0 disables suppression.
+
+    key_fn maps a request to its key, e.g. cache_llm.normalise so that
+    "Bark!" and "bark" coalesce.
+    """
+    def __init__(self, window=2.0, key_fn=None):
+        self.window = window
+        self.key_fn = key_fn
+        self._in_flight = {}     # key -> future
+        self._first_seen = {}    # key -> monotonic time of the leading request
+        self.leaders = 0
+        self.coalesced = 0
+        self.suppressed = 0
+        self.republished = 0
+
+    def key(self, request):
+        return self.key_fn(request) if self.key_fn else request
+
+    def begin(self, key):
+        """Returns (role, future). Leaders must call finish() with the same future."""
+        now = monotonic()
+        self._expire(now)
+        first = self._first_seen.get(key)
+        if first is not None and now - first < self.window:
+            self.suppressed += 1
+            return SUPPRESSED, None
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return FOLLOWER, future
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting: don't warn about an unretrieved exception
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._in_flight[key] = future
+        if self.window > 0:
+            self._first_seen[key] = now
+        self.leaders += 1
+        return LEADER, future
+
+    def finish(self, key, future, result=None, error=None):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if future.done():
+            return
+        if error is not None and not isinstance(error, Exception):
+            # Leader cancelled / closed early: followers fail like any other error, not cancelled themselves
+            future.set_exception(RuntimeError(f"single-flight leader for {key!r} was abandoned"))
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def follow(self, future):
+        result = await asyncio.shield(future)
+        self.republished += 1
+        # Each caller gets its own copy, downstream code may mutate intents
+        return copy.deepcopy(result)
+
+    async def run(self, key, fn):
+        """Await fn() once per key in flight. Suppressed duplicates return None."""
+        role, future = self.begin(key)
+        if role == SUPPRESSED:
+            return None
+        if role == FOLLOWER:
+            return await self.follow(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "suppressed": self.suppressed,
+            "republished": self.republished,
+        }
+
+    def _expire(self, now):
+        # Insertion order is arrival order, so stop at the first live entry
+        while self._first_seen:
+            key, first = next(iter(self._first_seen.items()))
+            if now - first < self.window:
+                break
+            del self._first_seen[key]